@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+# Throughput benchmark for the bulk import/export endpoints.
+# Starts the fake PostgREST stand-in in a subprocess (or uses a throwaway SQLite
+# database with --backend sqlite), serves main.app in-process and streams N
+# synthetic users through /bulk/users/import and back out of /bulk/users/export.
+#
+#   python bench_bulk.py --rows 100000
+#   python bench_bulk.py --rows 100000 --backend sqlite
+
+ADMIN_TOKEN = "bench"
+
+def synthetic_rows(rows: int, fmt: str):
+    if fmt == "csv":
+        yield b"chat_id,city,latitude,longitude\n"
+    for i in range(rows):
+        chat_id = 700000000 + i
+        if i % 2:
+            record = {"chat_id": chat_id, "city": f"City{i % 5000}", "latitude": None, "longitude": None}
+        else:
+            record = {"chat_id": chat_id, "city": None, "latitude": round(-60 + (i % 13000) / 100, 4), "longitude": round(-180 + (i % 36000) / 100, 4)}
+        if fmt == "csv":
+            yield ",".join("" if v is None else str(v) for v in record.values()).encode() + b"\n"
+        else:
+            yield (json.dumps(record) + "\n").encode()
+
+async def chunked(rows: int, fmt: str, chunk_size: int = 64 * 1024):
+    buffer = bytearray()
+    for line in synthetic_rows(rows, fmt):
+        buffer += line
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+async def run(args):
+    stand_in = None
+    if args.backend == "sqlite":
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    else:
+        stand_in = subprocess.Popen(
+            [sys.executable, "fake_postgrest.py"],
+            env={**os.environ, "FAKE_POSTGREST_PORT": str(args.postgrest_port)},
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        os.environ["STORAGE_BACKEND"] = "supabase"
+        os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{args.postgrest_port}"
+        os.environ["SUPABASE_KEY"] = "local"
+    try:
+        os.environ["ADMIN_TOKEN"] = ADMIN_TOKEN
+        import main
+
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(1.0)  # let the stand-in finish starting
+
+        base_url = f"http://127.0.0.1:{args.port}"
+        headers = {"X-Admin-Token": ADMIN_TOKEN, "Content-Type": "text/csv" if args.format == "csv" else "application/x-ndjson"}
+        async with httpx.AsyncClient(timeout=600.0) as client:
+            started = time.perf_counter()
+            response = await client.post(f"{base_url}/bulk/users/import", content=chunked(args.rows, args.format), headers=headers)
+            import_seconds = time.perf_counter() - started
+            result = response.json()
+            print(f"Import: {result.get('rows_imported')} rows in {import_seconds:.2f}s "
+                  f"({args.rows / import_seconds:,.0f} rows/s) errors={result.get('errors')}")
+
+            started = time.perf_counter()
+            exported = 0
+            async with client.stream("GET", f"{base_url}/bulk/users/export", params={"format": args.format}, headers=headers) as stream:
+                async for line in stream.aiter_lines():
+                    if line:
+                        exported += 1
+            if args.format == "csv":
+                exported -= 1
+            export_seconds = time.perf_counter() - started
+            print(f"Export: {exported} rows in {export_seconds:.2f}s ({exported / export_seconds:,.0f} rows/s)")
+
+        server.should_exit = True
+        await server_task
+    finally:
+        if stand_in:
+            stand_in.terminate()
+            stand_in.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk user import/export")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--backend", choices=["supabase", "sqlite"], default="supabase")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--postgrest-port", type=int, default=54321)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import time
+
+import fast_json
+from bench_weather import synthetic_weather
+
+# Decode/encode timings for the payloads the API handles most: the raw 40-entry
+# OpenWeather forecast, the processed /weather body and a full users listing.
+# Compares the stdlib with whatever fast_json picked (orjson when installed).
+#
+#   python bench_json.py --users 100000
+
+def upstream_forecast(entries: int = 40) -> bytes:
+    start = int(time.time())
+    items = []
+    for i in range(entries):
+        dt = start + i * 10800
+        items.append({
+            "dt": dt,
+            "main": {"temp": 14.2 + i % 7, "feels_like": 13.5, "temp_min": 12.1, "temp_max": 15.9, "pressure": 1012, "sea_level": 1012, "grnd_level": 1008, "humidity": 71, "temp_kf": 0.4},
+            "weather": [{"id": 500, "main": "Rain", "description": "light rain", "icon": "10d"}],
+            "clouds": {"all": 75},
+            "wind": {"speed": 4.12, "deg": 210, "gust": 7.3},
+            "visibility": 10000,
+            "pop": 0.42,
+            "rain": {"3h": 0.31},
+            "sys": {"pod": "d"},
+            "dt_txt": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(dt))
+        })
+    payload = {
+        "cod": "200", "message": 0, "cnt": entries, "list": items,
+        "city": {"id": 2643743, "name": "London", "coord": {"lat": 51.5085, "lon": -0.1257}, "country": "GB", "population": 1000000, "timezone": 3600, "sunrise": start, "sunset": start + 40000}
+    }
+    return json.dumps(payload).encode()
+
+def users_rows(count: int) -> list:
+    return [
+        {"id": i + 1, "chat_id": 500000000 + i, "city": f"City {i % 5000}" if i % 3 else None,
+         "latitude": None if i % 3 else 51.5 + (i % 100) / 100, "longitude": None if i % 3 else -0.12,
+         "created_at": "2025-10-05T16:02:00.000000+00:00"}
+        for i in range(count)
+    ]
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+def stdlib_dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def compare(label: str, stdlib_fn, fast_fn, repeat: int):
+    slow = timed(stdlib_fn, repeat)
+    fast = timed(fast_fn, repeat)
+    print(f"{label:<28} json {slow * 1e6:10.1f} us   {fast_json.BACKEND} {fast * 1e6:10.1f} us   x{slow / fast:5.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare stdlib json with the fast_json backend")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    forecast_bytes = upstream_forecast()
+    weather = synthetic_weather("London")
+    users = users_rows(args.users)
+    users_bytes = stdlib_dumps(users)
+    users_repeat = max(3, args.repeat // 200)
+
+    compare("decode upstream forecast", lambda: json.loads(forecast_bytes), lambda: fast_json.loads(forecast_bytes), args.repeat)
+    compare("encode /weather body", lambda: stdlib_dumps(weather), lambda: fast_json.dumps(weather), args.repeat)
+    compare(f"decode {args.users} users", lambda: json.loads(users_bytes), lambda: fast_json.loads(users_bytes), users_repeat)
+    compare(f"encode {args.users} users", lambda: stdlib_dumps(users), lambda: fast_json.dumps(users), users_repeat)
+
+if __name__ == "__main__":
+    main()
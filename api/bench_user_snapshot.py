@@ -0,0 +1,71 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from user_snapshot import UserSnapshot
+
+# Memory benchmark: alert sweep over N users held as JSON-decoded dicts
+# (what storage.select("users") returns) versus the columnar UserSnapshot.
+#
+#   python bench_user_snapshot.py --users 1000000
+
+def synthetic_page(start: int, count: int, cities: int):
+    rows = []
+    for i in range(start, start + count):
+        if i % 3:
+            city, latitude, longitude = f"City {i % cities}", None, None
+        else:
+            city, latitude, longitude = None, round(random.uniform(-60, 70), 6), round(random.uniform(-180, 180), 6)
+        rows.append({
+            "id": i + 1,
+            "chat_id": 500000000 + i,
+            "city": city,
+            "latitude": latitude,
+            "longitude": longitude,
+            "created_at": "2025-10-05T16:02:00.000000+00:00"
+        })
+    # Round-trip through JSON so strings are fresh objects, as they are after response.json()
+    return json.loads(json.dumps(rows))
+
+def measure(label: str, build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<16} retained {current / 2**20:8.1f} MB   peak {peak / 2**20:8.1f} MB   build {elapsed:6.2f}s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list-of-dicts and columnar user snapshots")
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--cities", type=int, default=5000, help="distinct city names among city users")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    def build_dicts():
+        users = []
+        for start in range(0, args.users, args.page_size):
+            users.extend(synthetic_page(start, min(args.page_size, args.users - start), args.cities))
+        return users
+
+    def build_snapshot():
+        snapshot = UserSnapshot()
+        for start in range(0, args.users, args.page_size):
+            for row in synthetic_page(start, min(args.page_size, args.users - start), args.cities):
+                snapshot.add(row["chat_id"], row.get("city"), row.get("latitude"), row.get("longitude"))
+        return snapshot
+
+    print(f"{args.users:,} users")
+    users = measure("list of dicts", build_dicts)
+    del users
+    snapshot = measure("UserSnapshot", build_snapshot)
+    print(f"snapshot: {snapshot.stats()}")
+
+if __name__ == "__main__":
+    main()
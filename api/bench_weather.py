@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import os
+import time
+from urllib.parse import urlencode
+
+import httpx
+
+# Requests/sec benchmark for cache-hit /weather responses. The cache is warmed
+# with a synthetic 40-step forecast per city, so nothing goes upstream and the
+# numbers measure our own routing, validation and encoding work. In-process runs
+# call the ASGI app directly so client overhead doesn't dominate.
+#
+#   python bench_weather.py --requests 20000 --concurrency 50
+#   python bench_weather.py --gzip
+#   python bench_weather.py --url http://localhost:8000   (server started with the same cache)
+
+os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+os.environ.setdefault("WEATHER_STORE_PATH", "")
+
+def synthetic_weather(city: str) -> dict:
+    now = int(time.time())
+    forecast = []
+    for day in range(5):
+        forecast.append({
+            "date": time.strftime("%Y-%m-%d", time.gmtime(now + day * 86400)),
+            "temp_min": 11.2 + day,
+            "temp_max": 19.8 + day,
+            "description": "light rain",
+            "icon": "10d",
+            "humidity": 72,
+            "wind_speed": 4.1,
+            "times": [
+                {"time": f"{hour:02d}:00:00", "temperature": 14.5 + hour / 10, "description": "light rain", "icon": "10d"}
+                for hour in range(0, 24, 3)
+            ]
+        })
+    return {
+        "current": {
+            "city": city,
+            "country": "GB",
+            "temperature": 15.3,
+            "feels_like": 14.8,
+            "humidity": 72,
+            "pressure": 1012,
+            "description": "light rain",
+            "icon": "10d",
+            "wind_speed": 4.1,
+            "wind_direction": 200,
+            "visibility": 10.0,
+            "timestamp": now - 120
+        },
+        "forecast": forecast
+    }
+
+# Helper function to make one request straight against the ASGI app, returning the status code
+async def asgi_get(app, path: str, params: dict, headers: dict) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params).encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80)
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def run(get, cities: int, total: int, concurrency: int, headers: dict) -> float:
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            status = await get("/weather", {"city": f"City {i % cities}"}, headers)
+            if status != 200:
+                raise RuntimeError(f"Unexpected status {status}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark cache-hit /weather requests")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--gzip", action="store_true", help="send Accept-Encoding: gzip")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    args = parser.parse_args()
+
+    headers = {"Accept-Encoding": "gzip" if args.gzip else "identity"}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=httpx.Limits(max_connections=args.concurrency))
+
+        async def get(path: str, params: dict, headers: dict) -> int:
+            return (await client.get(path, params=params, headers=headers)).status_code
+    else:
+        import main as api
+        from weather_cache import location_key
+        for i in range(args.cities):
+            api.weather_cache.set(location_key(f"City {i}"), synthetic_weather(f"City {i}"))
+        client = httpx.AsyncClient()
+
+        async def get(path: str, params: dict, headers: dict) -> int:
+            return await asgi_get(api.app, path, params, headers)
+
+    async with client:
+        await run(get, args.cities, min(1000, args.requests), args.concurrency, headers)
+        elapsed = await run(get, args.cities, args.requests, args.concurrency, headers)
+
+    print(f"{args.requests} requests in {elapsed:.2f}s: {args.requests / elapsed:,.0f} req/s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
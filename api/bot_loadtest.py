@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import importlib
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+from telegram import Update
+import uvicorn
+
+from fake_telegram_server import FakeBotAPI, create_app
+
+# Load generator for the Telegram bot.
+# Starts the fake Bot API server, optionally runs the bot in-process against it,
+# replays synthetic /start, location and city-text updates at a fixed rate and
+# reports handler latency percentiles and throughput.
+#
+#   python bot_loadtest.py --rate 50 --duration 30
+#   python bot_loadtest.py --bot-module bot_server --mix start=2,location=1,city=1
+#   python bot_loadtest.py --external   # bot started separately with TELEGRAM_API_BASE_URL
+
+FAKE_TOKEN = "123456:LOADTEST"
+
+SAMPLE_CITIES = ["London", "New York", "Tokyo", "Paris", "Almaty", "Berlin", "Sydney", "Cairo"]
+
+class LoadGenerator:
+    def __init__(self, fake: FakeBotAPI, chats: int):
+        self.fake = fake
+        self.chat_ids = [500000000 + i for i in range(chats)]
+        self.message_ids = iter(range(1, 10**9))
+        self.callback_ids = iter(range(1, 10**9))
+        # Message updates are answered by sendMessage, callback queries by answerCallbackQuery.
+        # Per chat: [sent_at, replies still expected] for each message, answered at its last reply
+        self.pending_messages: Dict[int, deque] = {}
+        self.pending_callbacks: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.injected = 0
+        self.outgoing_messages = 0
+        fake.listeners.append(self.on_bot_call)
+
+    def on_bot_call(self, method: str, params: Dict[str, Any], now: float):
+        if method in ("sendMessage", "editMessageText"):
+            self.outgoing_messages += 1
+
+        if method == "sendMessage":
+            pending = self.pending_messages.get(int(params.get("chat_id", 0)))
+            if pending:
+                pending[0][1] -= 1
+                if pending[0][1] == 0:
+                    self.latencies.append(now - pending.popleft()[0])
+        elif method == "answerCallbackQuery":
+            sent_at = self.pending_callbacks.pop(params.get("callback_query_id"), None)
+            if sent_at is not None:
+                self.latencies.append(now - sent_at)
+
+    def _user(self, chat_id: int) -> Dict[str, Any]:
+        return {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}"}
+
+    def _message(self, chat_id: int, **fields) -> Dict[str, Any]:
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": self._user(chat_id)
+        }
+        message.update(fields)
+        return message
+
+    def push_message(self, chat_id: int, replies: int = 1, **fields):
+        self.pending_messages.setdefault(chat_id, deque()).append([time.perf_counter(), replies])
+        self.fake.push_update({"message": self._message(chat_id, **fields)})
+        self.injected += 1
+
+    def push_callback(self, chat_id: int, data: str):
+        callback_id = str(next(self.callback_ids))
+        self.pending_callbacks[callback_id] = time.perf_counter()
+        self.fake.push_update({
+            "callback_query": {
+                "id": callback_id,
+                "from": self._user(chat_id),
+                "chat_instance": str(chat_id),
+                "data": data,
+                "message": self._message(chat_id, text="Please share your location")
+            }
+        })
+        self.injected += 1
+
+    def inject(self, scenario: str):
+        chat_id = random.choice(self.chat_ids)
+
+        if scenario == "start":
+            self.push_message(
+                chat_id,
+                text="/start",
+                entities=[{"type": "bot_command", "offset": 0, "length": 6}]
+            )
+        elif scenario == "location":
+            # "Location received" first, then the registration result
+            self.push_message(
+                chat_id,
+                replies=2,
+                location={
+                    "latitude": round(random.uniform(-60, 70), 5),
+                    "longitude": round(random.uniform(-180, 180), 5)
+                }
+            )
+        elif scenario == "city":
+            # "Enter Manually" button press followed by the typed city name
+            self.push_callback(chat_id, "enter_city")
+            self.push_message(chat_id, text=random.choice(SAMPLE_CITIES))
+
+    @property
+    def unanswered(self) -> int:
+        return sum(len(p) for p in self.pending_messages.values()) + len(self.pending_callbacks)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("start", "location", "city"):
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}'")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def print_report(generator: LoadGenerator, elapsed: float):
+    latencies = sorted(generator.latencies)
+    answered = len(latencies)
+    print("\n=== Bot load test ===")
+    print(f"Updates injected:   {generator.injected}")
+    print(f"Updates answered:   {answered} ({generator.unanswered} unanswered)")
+    print(f"Elapsed:            {elapsed:.2f}s")
+    print(f"Updates/sec:        {answered / elapsed:.1f}")
+    print(f"Messages/sec:       {generator.outgoing_messages / elapsed:.1f} ({generator.outgoing_messages} sent/edited)")
+    if latencies:
+        print("Handler latency (ms):")
+        for pct in (50, 90, 95, 99):
+            print(f"  p{pct:<3}             {percentile(latencies, pct) * 1000:.1f}")
+        print(f"  max              {latencies[-1] * 1000:.1f}")
+
+async def run(args):
+    fake = FakeBotAPI()
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    base_url = f"http://127.0.0.1:{args.port}/bot"
+    application = None
+    if args.external:
+        print(f"Fake Bot API listening; start the bot with TELEGRAM_API_BASE_URL={base_url}")
+        print(f"and TELEGRAM_BOT_TOKEN={FAKE_TOKEN}")
+        while not fake.calls:
+            await asyncio.sleep(0.1)
+    else:
+        bot_module = importlib.import_module(args.bot_module)
+        if args.api_url:
+            # The handlers live in telegram_bot whichever module builds the application
+            importlib.import_module("telegram_bot").API_BASE_URL = args.api_url
+        application = bot_module.build_application(token=FAKE_TOKEN, base_url=base_url)
+        await application.initialize()
+        await application.start()
+        await application.updater.start_polling(poll_interval=0.0, timeout=10, allowed_updates=Update.ALL_TYPES)
+
+    generator = LoadGenerator(fake, args.chats)
+    weights = parse_mix(args.mix)
+    scenarios, scenario_weights = list(weights), list(weights.values())
+
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    for i in range(total):
+        # Fixed-rate schedule so slow handlers show up as latency, not lower offered load
+        delay = started + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        generator.inject(random.choices(scenarios, scenario_weights)[0])
+
+    drain_until = time.perf_counter() + args.drain
+    while generator.unanswered and time.perf_counter() < drain_until:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    print_report(generator, elapsed)
+
+    if application:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+    server.should_exit = True
+    await server_task
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic updates against the WeatherSphere bot")
+    parser.add_argument("--rate", type=float, default=20.0, help="updates per second to inject")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load to generate")
+    parser.add_argument("--chats", type=int, default=1000, help="number of distinct synthetic chats")
+    parser.add_argument("--mix", default="start=1,location=1,city=1", help="scenario weights")
+    parser.add_argument("--drain", type=float, default=30.0, help="max seconds to wait for replies after injection")
+    parser.add_argument("--port", type=int, default=8081, help="port for the fake Bot API server")
+    parser.add_argument("--bot-module", default="telegram_bot", choices=["telegram_bot", "bot_server"])
+    parser.add_argument("--api-url", default=None, help="override API_BASE_URL used by the bot handlers")
+    parser.add_argument("--external", action="store_true", help="don't start the bot, wait for an external one")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import time
+from collections import deque
+from typing import Any, Dict
+
+# Per-upstream circuit breaker. Calls that fail or take longer than
+# slow_call_seconds count against a rolling window; once too many of them are
+# bad the circuit opens and callers fail fast instead of queueing behind a
+# hanging upstream. After open_seconds a few probe calls are let through
+# (half-open) and their outcome decides whether the circuit closes again. A probe
+# that reports no outcome within probe_timeout is written off, so a lost probe
+# can't keep the circuit half-open forever.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_ratio: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        slow_call_seconds: float = 3.0,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        probe_timeout: float = 30.0
+    ):
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.probe_timeout = probe_timeout
+        self.outcomes: deque = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_started = 0.0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """Reserve a call slot, or raise CircuitOpen while the upstream is considered down"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpen(f"{self.name} circuit is open")
+            self.state = HALF_OPEN
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_probes and time.monotonic() - self.probe_started > self.probe_timeout:
+                self.probes = 0
+            if self.probes >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpen(f"{self.name} circuit is half-open, probe in progress")
+            self.probes += 1
+            self.probe_started = time.monotonic()
+
+    def release(self):
+        """The reserved call ended without an outcome (never sent, or cancelled)"""
+        if self.state == HALF_OPEN and self.probes:
+            self.probes -= 1
+
+    def record_success(self, elapsed: float):
+        if elapsed > self.slow_call_seconds:
+            self._record(False)
+            return
+        if self.state == HALF_OPEN:
+            self._close()
+            return
+        self._record(True)
+
+    def record_failure(self):
+        self._record(False)
+
+    def _record(self, ok: bool):
+        if self.state == HALF_OPEN:
+            if ok:
+                self._close()
+            else:
+                self._open()
+            return
+        self.outcomes.append(ok)
+        if len(self.outcomes) >= self.min_calls:
+            bad = self.outcomes.count(False)
+            if bad / len(self.outcomes) >= self.failure_ratio:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes = 0
+        self.times_opened += 1
+        print(f"Warning: {self.name} circuit opened")
+
+    def _close(self):
+        self.state = CLOSED
+        self.outcomes.clear()
+        self.probes = 0
+        print(f"{self.name} circuit closed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self.outcomes),
+            "recent_failures": self.outcomes.count(False),
+            "rejected": self.rejected,
+            "times_opened": self.times_opened
+        }
@@ -0,0 +1,190 @@
+import bisect
+import json
+import os
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request, Response
+import uvicorn
+
+# In-memory stand-in for the subset of PostgREST that SupabaseClient uses.
+# Point the API at it with SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=local
+
+OPERATORS = ("eq", "neq", "gt", "gte", "lt", "lte")
+RESERVED_PARAMS = ("select", "order", "limit", "offset", "on_conflict", "columns")
+
+class Table:
+    def __init__(self, unique: Optional[List[str]] = None):
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.ids: List[int] = []  # kept sorted for keyset pagination
+        self.next_id = count(1)
+        self.unique = {column: {} for column in (unique or [])}
+
+    def insert(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        for column, index in self.unique.items():
+            if data.get(column) is not None and data[column] in index:
+                raise KeyError(column)
+        row = {"id": next(self.next_id), **data}
+        self.rows[row["id"]] = row
+        self.ids.append(row["id"])
+        for column, index in self.unique.items():
+            if row.get(column) is not None:
+                index[row[column]] = row["id"]
+        return row
+
+    def update(self, row: Dict[str, Any], data: Dict[str, Any]):
+        for column, index in self.unique.items():
+            if column in data and row.get(column) is not None:
+                index.pop(row[column], None)
+        row.update(data)
+        for column, index in self.unique.items():
+            if row.get(column) is not None:
+                index[row[column]] = row["id"]
+
+    def delete(self, row: Dict[str, Any]):
+        del self.rows[row["id"]]
+        del self.ids[bisect.bisect_left(self.ids, row["id"])]
+        for column, index in self.unique.items():
+            index.pop(row.get(column), None)
+
+def _coerce(value: str) -> Any:
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return None if value == "null" else value
+
+def _matches(row: Dict[str, Any], filters: List[tuple]) -> bool:
+    for column, op, value in filters:
+        current = row.get(column)
+        if op == "eq" and current != value:
+            return False
+        if op == "neq" and current == value:
+            return False
+        if op in ("gt", "gte", "lt", "lte"):
+            if current is None:
+                return False
+            if op == "gt" and not current > value:
+                return False
+            if op == "gte" and not current >= value:
+                return False
+            if op == "lt" and not current < value:
+                return False
+            if op == "lte" and not current <= value:
+                return False
+    return True
+
+def _filters(request: Request) -> List[tuple]:
+    filters = []
+    for column, raw in request.query_params.multi_items():
+        if column in RESERVED_PARAMS:
+            continue
+        op, _, value = raw.partition(".")
+        if op in OPERATORS:
+            filters.append((column, op, _coerce(value)))
+    return filters
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="Fake PostgREST")
+    tables: Dict[str, Table] = {"users": Table(unique=["chat_id"])}
+    app.state.tables = tables
+
+    def select_rows(table: Table, request: Request) -> List[Dict[str, Any]]:
+        filters = _filters(request)
+        params = request.query_params
+        ids = table.ids
+
+        # Fast path for keyset pagination (id=gt.N&order=id.asc)
+        id_filter = next((f for f in filters if f[0] == "id" and f[1] in ("gt", "eq")), None)
+        if id_filter and id_filter[1] == "gt":
+            ids = ids[bisect.bisect_right(ids, id_filter[2]):]
+        elif id_filter:
+            ids = [id_filter[2]] if id_filter[2] in table.rows else []
+
+        # Unique-column equality lookups avoid a scan too
+        unique_filter = next((f for f in filters if f[0] in table.unique and f[1] == "eq"), None)
+        if unique_filter:
+            row_id = table.unique[unique_filter[0]].get(unique_filter[2])
+            ids = [row_id] if row_id is not None and (id_filter is None or row_id in ids) else []
+
+        order = params.get("order", "id.asc")
+        column, _, direction = order.partition(".")
+        limit = int(params["limit"]) if "limit" in params else None
+        offset = int(params.get("offset", 0))
+
+        rows = []
+        source = ids if direction != "desc" else reversed(ids)
+        if column == "id":
+            for row_id in source:
+                row = table.rows[row_id]
+                if _matches(row, filters):
+                    rows.append(row)
+                    if limit is not None and len(rows) >= offset + limit:
+                        break
+        else:
+            rows = [table.rows[i] for i in ids if _matches(table.rows[i], filters)]
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction == "desc")
+
+        rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+        select = params.get("select", "*")
+        if select != "*":
+            columns = select.split(",")
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        return rows
+
+    def respond(request: Request, rows: List[Dict[str, Any]], status: int) -> Response:
+        if "return=representation" in request.headers.get("prefer", ""):
+            return Response(json.dumps(rows), status_code=status, media_type="application/json")
+        return Response(status_code=204 if status == 200 else status)
+
+    @app.get("/rest/v1/{table_name}")
+    async def get_rows(table_name: str, request: Request):
+        table = tables.setdefault(table_name, Table())
+        return Response(json.dumps(select_rows(table, request)), media_type="application/json")
+
+    @app.post("/rest/v1/{table_name}")
+    async def post_rows(table_name: str, request: Request):
+        table = tables.setdefault(table_name, Table())
+        payload = json.loads(await request.body())
+        items = payload if isinstance(payload, list) else [payload]
+        merge = "resolution=merge-duplicates" in request.headers.get("prefer", "")
+        on_conflict = request.query_params.get("on_conflict")
+
+        written = []
+        for item in items:
+            existing_id = table.unique.get(on_conflict, {}).get(item.get(on_conflict)) if merge and on_conflict else None
+            if existing_id is not None:
+                row = table.rows[existing_id]
+                table.update(row, item)
+                written.append(row)
+                continue
+            try:
+                written.append(table.insert(item))
+            except KeyError as e:
+                message = {"code": "23505", "message": f"duplicate key value violates unique constraint on {e.args[0]}"}
+                return Response(json.dumps(message), status_code=409, media_type="application/json")
+        return respond(request, written, 201)
+
+    @app.patch("/rest/v1/{table_name}")
+    async def patch_rows(table_name: str, request: Request):
+        table = tables.setdefault(table_name, Table())
+        data = json.loads(await request.body())
+        rows = select_rows(table, request)
+        for row in rows:
+            table.update(table.rows[row["id"]], data)
+        return respond(request, [table.rows[row["id"]] for row in rows], 200)
+
+    @app.delete("/rest/v1/{table_name}")
+    async def delete_rows(table_name: str, request: Request):
+        table = tables.setdefault(table_name, Table())
+        rows = select_rows(table, request)
+        for row in rows:
+            table.delete(table.rows[row["id"]])
+        return respond(request, rows, 200)
+
+    return app
+
+if __name__ == "__main__":
+    port = int(os.environ.get("FAKE_POSTGREST_PORT", 54321))
+    uvicorn.run(create_app(), host="127.0.0.1", port=port, log_level="warning")
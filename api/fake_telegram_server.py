@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import time
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+import uvicorn
+
+# Local stand-in for the Telegram Bot API.
+# Point the bot at it with TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot
+
+FAKE_BOT_USER = {
+    "id": 1000000001,
+    "is_bot": True,
+    "first_name": "WeatherSphere",
+    "username": "weathersphere_fake_bot"
+}
+
+class FakeBotAPI:
+    def __init__(self):
+        self.updates: List[Dict[str, Any]] = []
+        self.new_update = asyncio.Event()
+        self.update_ids = count(1)
+        self.message_ids = count(1)
+        self.webhook_url = ""
+        # Every outgoing call the bot makes: (method, params, monotonic timestamp)
+        self.calls: List[tuple] = []
+        # Called with (method, params, timestamp) so a load generator can match replies
+        self.listeners: List[Callable[[str, Dict[str, Any], float], None]] = []
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """Queue an update for getUpdates and return its update_id"""
+        update_id = next(self.update_ids)
+        update["update_id"] = update_id
+        self.updates.append(update)
+        self.new_update.set()
+        return update_id
+
+    def _record(self, method: str, params: Dict[str, Any]):
+        now = time.perf_counter()
+        self.calls.append((method, params, now))
+        for listener in self.listeners:
+            listener(method, params, now)
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params.get("chat_id", 0))
+        message_id = params.get("message_id")
+        return {
+            "message_id": int(message_id) if message_id else next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": FAKE_BOT_USER,
+            "text": params.get("text", "")
+        }
+
+    async def get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset", 0) or 0)
+        limit = int(params.get("limit", 100) or 100)
+        timeout = float(params.get("timeout", 0) or 0)
+
+        # Updates below the offset are confirmed by the bot and can be dropped
+        if offset:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+
+        if not self.updates and timeout:
+            self.new_update.clear()
+            try:
+                await asyncio.wait_for(self.new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return self.updates[:limit]
+
+    async def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getUpdates":
+            return await self.get_updates(params)
+
+        self._record(method, params)
+
+        if method == "getMe":
+            return FAKE_BOT_USER
+        if method == "setWebhook":
+            self.webhook_url = params.get("url", "")
+            return True
+        if method == "deleteWebhook":
+            self.webhook_url = ""
+            if str(params.get("drop_pending_updates", "")).lower() == "true":
+                self.updates = []
+            return True
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": len(self.updates)}
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params)
+        if method == "answerCallbackQuery":
+            return True
+
+        # Anything else the bot might call is accepted and ignored
+        return True
+
+async def _read_params(request: Request) -> Dict[str, Any]:
+    body = await request.body()
+    if not body:
+        return dict(request.query_params)
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body)
+
+    # PTB sends form-encoded parameters with JSON-encoded nested values
+    return {key: values[-1] for key, values in parse_qs(body.decode()).items()}
+
+def create_app(fake: Optional[FakeBotAPI] = None) -> FastAPI:
+    fake = fake or FakeBotAPI()
+    app = FastAPI(title="Fake Telegram Bot API")
+    app.state.fake = fake
+
+    @app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+    async def bot_method(token: str, method: str, request: Request):
+        params = await _read_params(request)
+        result = await fake.handle(method, params)
+        return {"ok": True, "result": result}
+
+    @app.post("/_inject")
+    async def inject(request: Request):
+        # Lets an out-of-process load generator push raw updates
+        update_id = fake.push_update(await request.json())
+        return {"ok": True, "update_id": update_id}
+
+    @app.get("/_calls")
+    async def calls():
+        return {"ok": True, "count": len(fake.calls)}
+
+    return app
+
+if __name__ == "__main__":
+    port = int(os.environ.get("FAKE_TELEGRAM_PORT", 8081))
+    uvicorn.run(create_app(), host="127.0.0.1", port=port)
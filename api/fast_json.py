@@ -0,0 +1,36 @@
+import json
+import os
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+# JSON encoding/decoding for upstream bodies and API responses.
+# Uses orjson when it is installed (and FAST_JSON isn't "false"), otherwise the
+# stdlib with the same compact output, so callers never need to care which one runs.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.getenv("FAST_JSON", "true").lower() == "false":
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """Default response class for the API; FastAPI has already made the content JSON-compatible"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,162 @@
+import datetime
+import math
+import sys
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+# Columnar view of OpenWeather's 3-hourly /forecast list.
+# The list is decoded once into parallel arrays; daily summaries are computed
+# over contiguous runs of steps that share a *local* date (using the city's UTC
+# offset from the response), so a day in Tokyo or Los Angeles matches the
+# calendar day people there see. Has no web-framework dependencies so the API,
+# the alert sweep and the bot can all use it.
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+@lru_cache(maxsize=1024)
+def clock(seconds: int) -> str:
+    """HH:MM:SS for a second of the day; forecasts only use a handful of distinct ones"""
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+class ForecastSeries:
+    def __init__(self, timezone_offset: int = 0):
+        self.timezone_offset = timezone_offset
+        self.timestamps = array("q")
+        self.temperatures = array("d")
+        self.temp_min = array("d")
+        self.temp_max = array("d")
+        self.humidity = array("d")
+        self.wind_speed = array("d")
+        self.descriptions: List[str] = []
+        self.icons: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_upstream(cls, data: Dict[str, Any]) -> "ForecastSeries":
+        """Decode a /forecast response body"""
+        series = cls(int(data.get("city", {}).get("timezone") or 0))
+        items = data.get("list") or []
+        if any(items[i]["dt"] > items[i + 1]["dt"] for i in range(len(items) - 1)):
+            items = sorted(items, key=lambda item: item["dt"])
+
+        series.timestamps = array("q", [item["dt"] for item in items])
+        series.temperatures = array("d", [item["main"]["temp"] for item in items])
+        series.temp_min = array("d", [item["main"].get("temp_min", item["main"]["temp"]) for item in items])
+        series.temp_max = array("d", [item["main"].get("temp_max", item["main"]["temp"]) for item in items])
+        series.humidity = array("d", [item["main"]["humidity"] for item in items])
+        series.wind_speed = array("d", [item["wind"]["speed"] for item in items])
+        # Only a handful of distinct conditions per forecast, so intern them
+        series.descriptions = [sys.intern(item["weather"][0]["description"]) for item in items]
+        series.icons = [sys.intern(item["weather"][0]["icon"]) for item in items]
+        return series
+
+    def to_columns(self) -> Dict[str, Any]:
+        """JSON-friendly columns kept next to the processed payload, enough to rebuild hourly data"""
+        return {
+            "timezone": self.timezone_offset,
+            "dt": list(self.timestamps),
+            "temperature": list(self.temperatures),
+            "humidity": list(self.humidity),
+            "wind_speed": list(self.wind_speed)
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "ForecastSeries":
+        series = cls(int(columns.get("timezone") or 0))
+        series.timestamps = array("q", columns["dt"])
+        series.temperatures = array("d", columns["temperature"])
+        series.humidity = array("d", columns["humidity"])
+        series.wind_speed = array("d", columns["wind_speed"])
+        return series
+
+    def interpolate(self, step: int = 3600) -> Dict[str, array]:
+        """Linear interpolation of temperature, humidity and wind onto a `step`-second grid"""
+        hourly = {
+            "dt": array("q"),
+            "temperature": array("d"),
+            "humidity": array("d"),
+            "wind_speed": array("d")
+        }
+        count = len(self.timestamps)
+        if count == 0:
+            return hourly
+        columns = (
+            (self.temperatures, hourly["temperature"]),
+            (self.humidity, hourly["humidity"]),
+            (self.wind_speed, hourly["wind_speed"])
+        )
+
+        # Walk each 3-hour interval once; every column shares the same weights
+        for i in range(count - 1):
+            t0, t1 = self.timestamps[i], self.timestamps[i + 1]
+            span = t1 - t0
+            if span <= 0:
+                continue
+            offsets = range(0, span, step)
+            hourly["dt"].extend(t0 + offset for offset in offsets)
+            for source, target in columns:
+                v0, v1 = source[i], source[i + 1]
+                slope = (v1 - v0) / span
+                target.extend(v0 + slope * offset for offset in offsets)
+
+        hourly["dt"].append(self.timestamps[-1])
+        for source, target in columns:
+            target.append(source[-1])
+        return hourly
+
+    def local_days(self) -> List[Tuple[int, int, int]]:
+        """(local day number, start, end) for each run of steps on the same local date"""
+        runs = []
+        offset = self.timezone_offset
+        start = 0
+        current = None
+        for i, ts in enumerate(self.timestamps):
+            day = (ts + offset) // 86400
+            if day != current:
+                if current is not None:
+                    runs.append((current, start, i))
+                current, start = day, i
+        if current is not None:
+            runs.append((current, start, len(self.timestamps)))
+        return runs
+
+    def local_time(self, index: int) -> str:
+        return clock((self.timestamps[index] + self.timezone_offset) % 86400)
+
+    def dominant_condition(self, start: int, end: int) -> Tuple[str, str]:
+        """Most frequent description in [start, end) (earliest wins ties) and its first icon"""
+        counts = Counter(self.descriptions[start:end])
+        best = max(counts.values())
+        for i in range(start, end):
+            if counts[self.descriptions[i]] == best:
+                return self.descriptions[i], self.icons[i]
+        return "", ""
+
+    def daily(self, days: int = 5) -> List[Dict[str, Any]]:
+        """Per local day: min/max/mean temperature, dominant condition, mean humidity and wind, and the steps"""
+        summaries = []
+        offset = self.timezone_offset
+        for day, start, end in self.local_days()[:days]:
+            count = end - start
+            description, icon = self.dominant_condition(start, end)
+            summaries.append({
+                "date": datetime.date.fromordinal(EPOCH_ORDINAL + day).isoformat(),
+                "temp_min": min(self.temp_min[start:end]),
+                "temp_max": max(self.temp_max[start:end]),
+                "temp_mean": round(math.fsum(self.temperatures[start:end]) / count, 2),
+                "description": description,
+                "icon": icon,
+                "humidity": round(math.fsum(self.humidity[start:end]) / count),
+                "wind_speed": round(math.fsum(self.wind_speed[start:end]) / count, 2),
+                "times": [
+                    {"time": clock((ts + offset) % 86400), "temperature": temperature, "description": step_description, "icon": step_icon}
+                    for ts, temperature, step_description, step_icon in zip(
+                        self.timestamps[start:end], self.temperatures[start:end], self.descriptions[start:end], self.icons[start:end]
+                    )
+                ]
+            })
+        return summaries
@@ -0,0 +1,146 @@
+import bisect
+import csv
+import heapq
+import os
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+# Offline gazetteer of major cities, loaded from a bundled CSV
+# (id, name, country, lat, lon, population, alternate_names separated by "|").
+# Names and alternate names are normalized and kept in one sorted list with a
+# parallel array of city indices, so a prefix is a bisect plus a short scan and
+# an exact name is a dict lookup. Matches on a city's own name rank above matches
+# on an alternate name, then by population. Canonical ids are stable slugs like "gb-london".
+
+DEFAULT_CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cities.csv")
+
+# Prefixes this short match too many names to scan per keystroke; their top results are precomputed
+SHORT_PREFIX_LENGTH = 2
+SHORT_PREFIX_RESULTS = 20
+
+def normalize_name(text: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a place name"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in folded).split())
+
+def split_country(query: str) -> Tuple[str, Optional[str]]:
+    """'Paris, FR' -> ('Paris', 'FR'); a trailing part that isn't a 2-letter code is kept in the name"""
+    name, _, country = query.rpartition(",")
+    country = country.strip()
+    if name.strip() and len(country) == 2 and country.isalpha():
+        # "Springfield, IL, US": the middle part is a state we don't track
+        return name.split(",")[0].strip(), country.upper()
+    return query.strip(), None
+
+class GazetteerCity:
+    __slots__ = ("id", "name", "country", "latitude", "longitude", "population")
+
+    def __init__(self, id: str, name: str, country: str, latitude: float, longitude: float, population: int):
+        self.id = id
+        self.name = name
+        self.country = country
+        self.latitude = latitude
+        self.longitude = longitude
+        self.population = population
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}, {self.country}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "country": self.country,
+            "label": self.label,
+            "lat": self.latitude,
+            "lon": self.longitude
+        }
+
+class Gazetteer:
+    def __init__(self, cities: Optional[List[GazetteerCity]] = None, names: Optional[List[Tuple[str, int, bool]]] = None):
+        self.cities: List[GazetteerCity] = cities or []
+        self.by_id: Dict[str, int] = {city.id: i for i, city in enumerate(self.cities)}
+
+        # (normalized name, city index, is alternate name); the primary entry sorts first on duplicates
+        entries = sorted(set(names or []))
+        self.keys: List[str] = [key for key, _, _ in entries]
+        self.refs = array("I", [index for _, index, _ in entries])
+        self.alternate = array("B", [alternate for _, _, alternate in entries])
+
+        # Exact names: own-name matches first, then most populous
+        self.exact: Dict[str, List[int]] = {}
+        for key, index, alternate in entries:
+            self.exact.setdefault(key, []).append(index)
+        for key, indices in self.exact.items():
+            indices.sort(key=lambda i: (normalize_name(self.cities[i].name) != key, -self.cities[i].population))
+
+        self.short_prefixes: Dict[str, List[int]] = {}
+        for prefix in {key[:length] for key in self.keys for length in range(1, SHORT_PREFIX_LENGTH + 1)}:
+            self.short_prefixes[prefix] = self._ranked(*self._span(prefix), SHORT_PREFIX_RESULTS)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CITIES_PATH) -> "Gazetteer":
+        cities: List[GazetteerCity] = []
+        names: List[Tuple[str, int]] = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                index = len(cities)
+                cities.append(GazetteerCity(
+                    row["id"],
+                    row["name"],
+                    row["country"].upper(),
+                    float(row["lat"]),
+                    float(row["lon"]),
+                    int(row.get("population") or 0)
+                ))
+                for position, name in enumerate([row["name"], *(row.get("alternate_names") or "").split("|")]):
+                    key = normalize_name(name)
+                    if key:
+                        names.append((key, index, position > 0))
+        return cls(cities, names)
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def get(self, city_id: str) -> Optional[GazetteerCity]:
+        index = self.by_id.get(city_id)
+        return self.cities[index] if index is not None else None
+
+    def _span(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff", lo)
+        return lo, hi
+
+    def _ranked(self, lo: int, hi: int, limit: int, country: Optional[str] = None) -> List[int]:
+        # A city can match through several of its names; count it once, by its best match
+        primary: Dict[int, bool] = {}
+        for position in range(lo, hi):
+            index = self.refs[position]
+            if country is not None and self.cities[index].country != country:
+                continue
+            primary[index] = primary.get(index, False) or not self.alternate[position]
+        return heapq.nlargest(limit, primary, key=lambda i: (primary[i], self.cities[i].population, -i))
+
+    def resolve(self, query: str) -> Optional[GazetteerCity]:
+        """Canonical city for a typed name like 'london', 'München' or 'Paris, FR', if known"""
+        name, country = split_country(query)
+        for index in self.exact.get(normalize_name(name), ()):
+            city = self.cities[index]
+            if country is None or city.country == country:
+                return city
+        return None
+
+    def complete(self, query: str, limit: int = 10) -> List[GazetteerCity]:
+        """Cities with a name starting with query, most populous first"""
+        name, country = split_country(query)
+        prefix = normalize_name(name)
+        if not prefix:
+            return []
+        if country is None and len(prefix) <= SHORT_PREFIX_LENGTH and limit <= SHORT_PREFIX_RESULTS:
+            indices = self.short_prefixes.get(prefix, [])[:limit]
+        else:
+            indices = self._ranked(*self._span(prefix), limit, country)
+        return [self.cities[i] for i in indices]
@@ -0,0 +1,170 @@
+import bisect
+import math
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlite_db import connect_sqlite
+
+# Time series of observed conditions per location.
+# With a path, observations are appended to a SQLite table clustered on
+# (location, ts): months of history for thousands of locations, a time index for
+# range scans, shared by every worker and no per-location state in memory.
+# Without one they go into fixed-size per-location ring buffers (parallel arrays,
+# ~20 bytes per observation) for at most max_locations locations.
+
+HISTORY_FIELDS = ("temperature", "humidity", "wind_speed", "pressure")
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    location TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    temperature REAL,
+    humidity REAL,
+    wind_speed REAL,
+    pressure REAL,
+    PRIMARY KEY (location, ts)
+) WITHOUT ROWID;
+"""
+
+class RingSeries:
+    """Fixed-capacity columnar ring buffer of observations, oldest overwritten first"""
+
+    __slots__ = ("capacity", "timestamps", "columns", "head")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # Arrays grow on demand up to capacity, so rarely-seen locations stay small
+        self.timestamps = array("I")
+        self.columns = [array("f") for _ in HISTORY_FIELDS]
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, ts: int, values: Tuple[float, ...]):
+        if len(self.timestamps) < self.capacity:
+            self.timestamps.append(ts)
+            for column, value in zip(self.columns, values):
+                column.append(value)
+            return
+        self.timestamps[self.head] = ts
+        for column, value in zip(self.columns, values):
+            column[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+
+    def last_ts(self) -> Optional[int]:
+        if not self.timestamps:
+            return None
+        return self.timestamps[self.head - 1]
+
+    def _ordered(self, column: array) -> array:
+        return column[self.head:] + column[:self.head] if self.head else column
+
+    def range(self, start: int, end: int) -> Tuple[array, List[array]]:
+        """(timestamps, columns) with start <= ts < end, in time order"""
+        timestamps = self._ordered(self.timestamps)
+        lo = bisect.bisect_left(timestamps, start)
+        hi = bisect.bisect_left(timestamps, end)
+        return timestamps[lo:hi], [self._ordered(column)[lo:hi] for column in self.columns]
+
+class HistoryStore:
+    def __init__(self, capacity: int = 1008, max_locations: int = 5000, path: Optional[str] = None, retention_days: float = 90):
+        self.capacity = capacity
+        self.max_locations = max_locations
+        self.retention = retention_days * 86400
+        self.series: "OrderedDict[str, RingSeries]" = OrderedDict()
+        self.conn = None
+        self.writes_since_prune = 0
+        # Observations this worker added; the table itself is too large to count on every stats call
+        self.recorded = 0
+        if path:
+            self.conn = connect_sqlite(path, HISTORY_SCHEMA)
+
+    def record(self, key: str, ts: int, values: Tuple[float, ...]) -> bool:
+        """Add one observation; repeats of the latest observation time are ignored"""
+        if self.conn is not None:
+            # The primary key drops repeats of an observation another worker already stored
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO observations (location, ts, temperature, humidity, wind_speed, pressure) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, ts, *values)
+            )
+            self.writes_since_prune += 1
+            if self.writes_since_prune >= 1000:
+                self.prune()
+            if cursor.rowcount > 0:
+                self.recorded += 1
+                return True
+            return False
+
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = RingSeries(self.capacity)
+            # Forget the least recently updated locations so memory stays bounded
+            while len(self.series) > self.max_locations:
+                self.series.popitem(last=False)
+        else:
+            self.series.move_to_end(key)
+            last = series.last_ts()
+            if last is not None and ts <= last:
+                return False
+        series.append(ts, values)
+        return True
+
+    def prune(self):
+        self.writes_since_prune = 0
+        if self.conn is not None:
+            self.conn.execute("DELETE FROM observations WHERE ts < ?", (int(time.time() - self.retention),))
+
+    def range(self, key: str, start: int, end: int) -> Tuple[List[int], List[List[float]]]:
+        """Observations with start <= ts < end, in time order"""
+        if self.conn is None:
+            series = self.series.get(key)
+            if series is None:
+                return [], [[] for _ in HISTORY_FIELDS]
+            timestamps, columns = series.range(start, end)
+            return list(timestamps), [list(column) for column in columns]
+
+        rows = self.conn.execute(
+            "SELECT ts, temperature, humidity, wind_speed, pressure FROM observations "
+            "WHERE location = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (key, start, end)
+        ).fetchall()
+        timestamps = [row[0] for row in rows]
+        columns = [[row[i + 1] for row in rows] for i in range(len(HISTORY_FIELDS))]
+        return timestamps, columns
+
+    def downsample(self, key: str, start: int, end: int, bucket: int) -> List[Dict[str, Any]]:
+        """min/max/mean of each field per `bucket` seconds; empty buckets are left out"""
+        timestamps, columns = self.range(key, start, end)
+        buckets = []
+        i = 0
+        count = len(timestamps)
+        while i < count:
+            bucket_start = start + (timestamps[i] - start) // bucket * bucket
+            j = bisect.bisect_left(timestamps, bucket_start + bucket, i)
+            summary: Dict[str, Any] = {"start": bucket_start, "count": j - i}
+            for field, column in zip(HISTORY_FIELDS, columns):
+                values = [v for v in column[i:j] if v is not None and not math.isnan(v)]
+                summary[field] = {
+                    "min": round(min(values), 2),
+                    "max": round(max(values), 2),
+                    "mean": round(math.fsum(values) / len(values), 2)
+                } if values else None
+            buckets.append(summary)
+            i = j
+        return buckets
+
+    def stats(self) -> Dict[str, Any]:
+        if self.conn is not None:
+            page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+            return {"persistent": True, "recorded": self.recorded, "bytes_on_disk": page_count * page_size}
+        points = sum(len(series) for series in self.series.values())
+        return {
+            "persistent": False,
+            "locations": len(self.series),
+            "points": points,
+            "bytes_in_memory": points * (4 + 4 * len(HISTORY_FIELDS))
+        }
@@ -0,0 +1,134 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlite_db import connect_sqlite
+
+# What OpenWeather resolved each query to. The first lookup of a spelling
+# ("q:londres", "city:gb-london") records the location's id, name, country and
+# coordinates from the response; later lookups of any spelling use the canonical
+# "ow:<id>" cache key and query upstream with id=. A recently used subset is kept
+# in memory, and the optional SQLite file survives restarts and is shared by workers.
+
+LOCATION_ALIASES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS location_aliases (
+    alias TEXT PRIMARY KEY,
+    location_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    country TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    resolved_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_location_aliases_resolved_at ON location_aliases(resolved_at);
+"""
+
+class LocationAlias:
+    __slots__ = ("location_id", "name", "country", "latitude", "longitude", "resolved_at")
+
+    def __init__(self, location_id: int, name: str, country: str, latitude: float, longitude: float, resolved_at: float):
+        self.location_id = location_id
+        self.name = name
+        self.country = country
+        self.latitude = latitude
+        self.longitude = longitude
+        self.resolved_at = resolved_at
+
+    @property
+    def key(self) -> str:
+        """Weather cache key shared by every spelling of this location"""
+        return f"ow:{self.location_id}"
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}, {self.country}" if self.country else self.name
+
+    @classmethod
+    def from_upstream(cls, data: Dict[str, Any]) -> Optional["LocationAlias"]:
+        """From a /weather response body; None when it doesn't name a location"""
+        if not data.get("id") or not data.get("name") or "coord" not in data:
+            return None
+        return cls(
+            int(data["id"]),
+            data["name"],
+            data.get("sys", {}).get("country") or "",
+            float(data["coord"]["lat"]),
+            float(data["coord"]["lon"]),
+            time.time()
+        )
+
+class LocationAliases:
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 10000, max_entries: int = 100000, ttl: float = 30 * 86400, compact_every: int = 500):
+        self.max_memory_entries = max_memory_entries
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.compact_every = compact_every
+        self.writes_since_compact = 0
+        self.entries: "OrderedDict[str, LocationAlias]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if path:
+            self.conn = connect_sqlite(path, LOCATION_ALIASES_SCHEMA)
+
+    def _remember(self, alias: str, location: LocationAlias):
+        self.entries[alias] = location
+        self.entries.move_to_end(alias)
+        while len(self.entries) > self.max_memory_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, alias: str) -> Optional[LocationAlias]:
+        location = self.entries.get(alias)
+        if location is None and self.conn is not None:
+            try:
+                row = self.conn.execute(
+                    "SELECT location_id, name, country, latitude, longitude, resolved_at FROM location_aliases WHERE alias = ?",
+                    (alias,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Warning: could not read location alias {alias}: {e}")
+                row = None
+            if row is not None:
+                location = LocationAlias(*row)
+        if location is None or time.time() - location.resolved_at > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(alias, location)
+        return location
+
+    def learn(self, alias: str, location: LocationAlias):
+        self._remember(alias, location)
+        if self.conn is None:
+            return
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO location_aliases (alias, location_id, name, country, latitude, longitude, resolved_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (alias, location.location_id, location.name, location.country, location.latitude, location.longitude, location.resolved_at)
+            )
+            self.writes_since_compact += 1
+            if self.writes_since_compact >= self.compact_every:
+                self.compact()
+        except sqlite3.Error as e:
+            print(f"Warning: could not persist location alias {alias}: {e}")
+
+    def compact(self):
+        """Drop expired aliases, then the least recently resolved beyond max_entries"""
+        self.writes_since_compact = 0
+        if self.conn is None:
+            return
+        self.conn.execute("DELETE FROM location_aliases WHERE resolved_at < ?", (time.time() - self.ttl,))
+        self.conn.execute(
+            "DELETE FROM location_aliases WHERE alias IN ("
+            "SELECT alias FROM location_aliases ORDER BY resolved_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "persisted_entries": self.conn.execute("SELECT COUNT(*) FROM location_aliases").fetchone()[0] if self.conn is not None else None,
+            "hits": self.hits,
+            "misses": self.misses
+        }
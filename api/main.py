@@ -1,15 +1,39 @@
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Response, Request, Header, Query
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import httpx
 import os
-import json
+import csv
+import io
+import codecs
+import asyncio
+import time
+import hashlib
+import re
+import gzip
+from email.utils import formatdate
+from collections import Counter
 from dotenv import load_dotenv
+from weather_cache import WeatherCache, location_key
+from weather_store import WeatherStore
+from history_store import HistoryStore, HISTORY_FIELDS
+from gazetteer import Gazetteer, DEFAULT_CITIES_PATH
+from location_aliases import LocationAlias, LocationAliases
+from storage import StorageError, create_storage
+from user_registry import UserRegistry
+from spatial_index import SpatialIndex
+from user_snapshot import UserSnapshot, DEFAULT_RULE
+from forecast import ForecastSeries
+from upstream_quota import UpstreamQuota, QuotaExceeded, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from circuit_breaker import CircuitBreaker, CircuitOpen
+import fast_json
+from fast_json import FastJSONResponse
 
 load_dotenv()
 
-app = FastAPI(title="WeatherSphere API")
+app = FastAPI(title="WeatherSphere API", default_response_class=FastJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -25,53 +49,219 @@ app.add_middleware(
 # Configuration
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
-
-# Supabase Configuration
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-# Simple Supabase HTTP client
-class SupabaseClient:
-    def __init__(self, url: str, key: str):
-        self.url = url
-        self.key = key
-        self.headers = {
-            "apikey": key,
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json",
-            "Prefer": "return=representation"
-        }
-
-    async def insert(self, table: str, data: dict):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.url}/rest/v1/{table}",
-                headers=self.headers,
-                json=data
-            )
-            return response
-
-    async def select(self, table: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.url}/rest/v1/{table}",
-                headers=self.headers
-            )
-            return response
-
-# Initialize Supabase client
-supabase = None
-if SUPABASE_URL and SUPABASE_KEY and not SUPABASE_URL.startswith("your_"):
+OPENWEATHER_GEO_URL = "https://api.openweathermap.org/geo/1.0"
+
+# Every OpenWeather call spends from this worker's share of the API key budget.
+# Interactive /weather lookups come first; alert sweeps and geocoding are background work.
+OPENWEATHER_CALLS_PER_MINUTE = float(os.getenv("OPENWEATHER_CALLS_PER_MINUTE", 60))
+OPENWEATHER_CALLS_PER_DAY = float(os.getenv("OPENWEATHER_CALLS_PER_DAY", 30000))
+OPENWEATHER_BACKGROUND_RESERVE = float(os.getenv("OPENWEATHER_BACKGROUND_RESERVE", 0.25))
+# Background calls run inside requests like POST /send_alerts, so by default they take a token
+# only if one is free right now and are dropped otherwise, rather than queueing for it
+OPENWEATHER_BACKGROUND_MAX_WAIT = float(os.getenv("OPENWEATHER_BACKGROUND_MAX_WAIT", 0))
+# Usage is counted in a SQLite file shared by the workers on the host (by default the weather
+# store's), so the limits are for the whole API key; OPENWEATHER_QUOTA_PATH="" counts per process
+OPENWEATHER_QUOTA_PATH = os.getenv("OPENWEATHER_QUOTA_PATH", os.getenv("WEATHER_STORE_PATH", "weather_cache.db"))
+upstream_quota_settings = dict(
+    per_minute=OPENWEATHER_CALLS_PER_MINUTE,
+    per_day=OPENWEATHER_CALLS_PER_DAY,
+    background_reserve=OPENWEATHER_BACKGROUND_RESERVE,
+    background_max_wait=OPENWEATHER_BACKGROUND_MAX_WAIT
+)
+try:
+    upstream_quota = UpstreamQuota(path=OPENWEATHER_QUOTA_PATH or None, **upstream_quota_settings)
+except Exception as e:
+    print(f"Warning: Failed to open upstream quota file {OPENWEATHER_QUOTA_PATH}: {e}")
+    upstream_quota = UpstreamQuota(**upstream_quota_settings)
+
+# Fail fast when OpenWeather is down or hanging: short timeouts plus a circuit breaker per
+# upstream. While a circuit is open, /weather serves the last known payload flagged as stale.
+OPENWEATHER_TIMEOUT = httpx.Timeout(float(os.getenv("OPENWEATHER_TIMEOUT", 4.0)), connect=2.0)
+OPENWEATHER_SLOW_CALL = float(os.getenv("OPENWEATHER_SLOW_CALL", 3.0))
+OPENWEATHER_CIRCUIT_OPEN_SECONDS = float(os.getenv("OPENWEATHER_CIRCUIT_OPEN_SECONDS", 30))
+upstream_breakers = {
+    OPENWEATHER_BASE_URL: CircuitBreaker("openweather", slow_call_seconds=OPENWEATHER_SLOW_CALL, open_seconds=OPENWEATHER_CIRCUIT_OPEN_SECONDS),
+    OPENWEATHER_GEO_URL: CircuitBreaker("openweather-geo", slow_call_seconds=OPENWEATHER_SLOW_CALL, open_seconds=OPENWEATHER_CIRCUIT_OPEN_SECONDS)
+}
+
+# Processed weather is cached per location; OpenWeather refreshes roughly every 10 minutes
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", 600))
+
+# /weather responses carry ETag and Cache-Control; max-age follows the cache entry and the
+# upstream observation time (dt), never dropping below a floor so clients still benefit
+OPENWEATHER_REFRESH_INTERVAL = int(os.getenv("OPENWEATHER_REFRESH_INTERVAL", 600))
+OPENWEATHER_MIN_MAX_AGE = int(os.getenv("OPENWEATHER_MIN_MAX_AGE", 60))
+
+# Sections a /weather client can ask for with include=
+WEATHER_SECTIONS = frozenset({"current", "daily", "hourly"})
+
+# Cache hits on /weather are served as pre-encoded JSON (plus a gzip variant) per snapshot,
+# skipping response model validation and re-serialization
+ENCODED_WEATHER_MAX_ENTRIES = int(os.getenv("ENCODED_WEATHER_MAX_ENTRIES", 2000))
+ENCODED_WEATHER_GZIP_LEVEL = int(os.getenv("ENCODED_WEATHER_GZIP_LEVEL", 6))
+encoded_weather: Dict[str, tuple] = {}
+
+# Hourly series interpolated from the 3-hourly forecast, computed once per location snapshot
+HOURLY_FORECAST_MAX_HOURS = 120
+hourly_forecasts: Dict[str, tuple] = {}
+
+# The cache is mirrored to a local SQLite file so a restart serves still-fresh entries
+# instead of sending its first wave of requests upstream. Workers on the same host share the
+# file, so only one of them refreshes an expired location. Set WEATHER_STORE_PATH="" to disable.
+WEATHER_STORE_PATH = os.getenv("WEATHER_STORE_PATH", "weather_cache.db")
+WEATHER_STORE_MAX_ENTRIES = int(os.getenv("WEATHER_STORE_MAX_ENTRIES", 5000))
+WEATHER_STORE_RETENTION = int(os.getenv("WEATHER_STORE_RETENTION", 86400))
+weather_store = None
+if WEATHER_STORE_PATH:
     try:
-        supabase = SupabaseClient(SUPABASE_URL, SUPABASE_KEY)
-        print("Supabase client initialized successfully")
+        weather_store = WeatherStore(WEATHER_STORE_PATH, max_entries=WEATHER_STORE_MAX_ENTRIES, retention=WEATHER_STORE_RETENTION)
     except Exception as e:
-        print(f"Warning: Failed to initialize Supabase client: {e}")
-        supabase = None
+        print(f"Warning: Failed to open weather store {WEATHER_STORE_PATH}: {e}")
+# Cities OpenWeather doesn't know are remembered briefly, so repeating a typo costs no quota
+WEATHER_MISSING_TTL = int(os.getenv("WEATHER_MISSING_TTL", 300))
+WEATHER_MISSING_MAX_ENTRIES = int(os.getenv("WEATHER_MISSING_MAX_ENTRIES", 10000))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", 5000))
+# A failed refresh is shared with the other workers for WEATHER_FAILURE_TTL seconds (an unknown
+# city for WEATHER_MISSING_TTL), so they fall back right away instead of retrying upstream in turn
+WEATHER_FAILURE_TTL = float(os.getenv("WEATHER_FAILURE_TTL", 10))
+
+# Helper function to pick the refresh failures other workers can reuse. A 503 (quota spent or
+# circuit open) reflects this worker's own state, so each worker decides that for itself.
+def shared_weather_failure(error: Exception) -> Optional[tuple]:
+    if isinstance(error, HTTPException) and error.status_code != 503:
+        return error.status_code, str(error.detail)
+    return None
+
+weather_cache = WeatherCache(
+    ttl=WEATHER_CACHE_TTL,
+    store=weather_store,
+    max_entries=WEATHER_CACHE_MAX_ENTRIES,
+    missing_ttl=WEATHER_MISSING_TTL,
+    max_missing=WEATHER_MISSING_MAX_ENTRIES,
+    failure_ttl=WEATHER_FAILURE_TTL,
+    shared_failure=shared_weather_failure,
+    failure_error=lambda status, detail: HTTPException(status_code=status, detail=detail)
+)
+try:
+    restored = weather_cache.load_from_store()
+    if restored:
+        print(f"Restored {restored} fresh weather entries from {WEATHER_STORE_PATH}")
+except Exception as e:
+    print(f"Warning: Failed to restore weather cache: {e}")
+
+# Every observation fetched upstream is kept for /history. With HISTORY_PATH set the series
+# goes to a SQLite file (months of data, shared by workers); with HISTORY_PATH="" it stays in
+# bounded per-location ring buffers of HISTORY_MEMORY_POINTS observations.
+HISTORY_PATH = os.getenv("HISTORY_PATH", "weather_history.db")
+HISTORY_MEMORY_POINTS = int(os.getenv("HISTORY_MEMORY_POINTS", 1008))
+HISTORY_MAX_LOCATIONS = int(os.getenv("HISTORY_MAX_LOCATIONS", 5000))
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", 90))
+HISTORY_MAX_BUCKETS = 1000
+try:
+    history_store = HistoryStore(
+        capacity=HISTORY_MEMORY_POINTS,
+        max_locations=HISTORY_MAX_LOCATIONS,
+        path=HISTORY_PATH or None,
+        retention_days=HISTORY_RETENTION_DAYS
+    )
+except Exception as e:
+    print(f"Warning: Failed to open history store {HISTORY_PATH}: {e}")
+    history_store = HistoryStore(capacity=HISTORY_MEMORY_POINTS, max_locations=HISTORY_MAX_LOCATIONS)
+
+# Offline gazetteer: canonical ids and coordinates for known cities, and /autocomplete
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", DEFAULT_CITIES_PATH)
+AUTOCOMPLETE_MAX_RESULTS = 20
+try:
+    gazetteer = Gazetteer.load(GAZETTEER_PATH)
+except Exception as e:
+    print(f"Warning: Failed to load gazetteer {GAZETTEER_PATH}: {e}")
+    gazetteer = Gazetteer()
+
+# What OpenWeather resolved each city spelling to; later lookups use the canonical key and id=.
+# Kept in a SQLite file shared by workers; set LOCATION_ALIASES_PATH="" to keep them in memory only.
+LOCATION_ALIASES_PATH = os.getenv("LOCATION_ALIASES_PATH", "location_aliases.db")
+LOCATION_ALIASES_MAX_ENTRIES = int(os.getenv("LOCATION_ALIASES_MAX_ENTRIES", 100000))
+LOCATION_ALIASES_TTL = int(os.getenv("LOCATION_ALIASES_TTL", 30 * 86400))
+try:
+    location_aliases = LocationAliases(LOCATION_ALIASES_PATH or None, max_entries=LOCATION_ALIASES_MAX_ENTRIES, ttl=LOCATION_ALIASES_TTL)
+except Exception as e:
+    print(f"Warning: Failed to open location aliases {LOCATION_ALIASES_PATH}: {e}")
+    location_aliases = LocationAliases(max_entries=LOCATION_ALIASES_MAX_ENTRIES, ttl=LOCATION_ALIASES_TTL)
+
+# Bulk import/export settings (endpoints are disabled unless ADMIN_TOKEN is set)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+BULK_MAX_INFLIGHT = int(os.getenv("BULK_MAX_INFLIGHT", 4))
+USER_EXPORT_COLUMNS = ["chat_id", "city", "latitude", "longitude"]
+
+# Upstream lookups the alert sweep runs at once
+ALERT_SWEEP_CONCURRENCY = int(os.getenv("ALERT_SWEEP_CONCURRENCY", 10))
+
+# Browsers may reuse a dashboard response this long; it is per-user, so shared caches must not
+DASHBOARD_MAX_AGE = int(os.getenv("DASHBOARD_MAX_AGE", 60))
+
+# Batch weather lookups: items per request and locations resolved at once
+WEATHER_BATCH_MAX_ITEMS = int(os.getenv("WEATHER_BATCH_MAX_ITEMS", 50))
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", 10))
+
+# Initialize the storage backend (Supabase over HTTP by default, or local SQLite)
+storage = None
+try:
+    storage = create_storage()
+except Exception as e:
+    print(f"Warning: Failed to initialize storage backend: {e}")
+    storage = None
+
+# Users are read through an in-process registry keyed by chat_id; writes go through it too
+USER_REGISTRY_TTL = int(os.getenv("USER_REGISTRY_TTL", 300))
+USER_REGISTRY_PRELOAD = os.getenv("USER_REGISTRY_PRELOAD", "false").lower() == "true"
+# Each instance caches users on its own. Instances that can be addressed separately (one per
+# port or host) list each other in USER_REGISTRY_PEERS and are told when a user changes;
+# workers sharing a port can't be, so run those with USER_REGISTRY_TTL=0 (no caching)
+USER_REGISTRY_PEERS = [peer.strip().rstrip("/") for peer in os.getenv("USER_REGISTRY_PEERS", "").split(",") if peer.strip()]
+user_registry = UserRegistry(storage, ttl=USER_REGISTRY_TTL, missing_ttl=min(30, USER_REGISTRY_TTL)) if storage else None
+registry_peer_tasks = set()
+
+# Helper function to tell the other API instances to drop a changed user (None: all users)
+def notify_registry_peers(chat_id: Optional[int]):
+    params = {"chat_id": chat_id} if chat_id is not None else {}
+
+    async def send():
+        async with httpx.AsyncClient(timeout=2.0) as client:
+            for peer in USER_REGISTRY_PEERS:
+                try:
+                    response = await client.post(f"{peer}/internal/users/invalidate", params=params, headers={"X-Admin-Token": ADMIN_TOKEN})
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    print(f"Warning: Failed to invalidate users on {peer}: {e}")
+
+    task = asyncio.ensure_future(send())
+    registry_peer_tasks.add(task)
+    task.add_done_callback(registry_peer_tasks.discard)
+
+if user_registry and USER_REGISTRY_PEERS:
+    if ADMIN_TOKEN:
+        user_registry.listeners.append(notify_registry_peers)
+    else:
+        print("Warning: USER_REGISTRY_PEERS is set but ADMIN_TOKEN is not; peers won't be notified")
+
+# Spatial index over user coordinates for area-based alert targeting, built on first use.
+# City-only users are placed at their city's coordinates (cached per location key).
+SPATIAL_CELL_DEGREES = float(os.getenv("SPATIAL_CELL_DEGREES", 1.0))
+spatial_index = SpatialIndex(cell_degrees=SPATIAL_CELL_DEGREES)
+spatial_index_state = {"ready": False, "lock": None}
+# /users/nearby answers at most this many users, within half the Earth's circumference
+NEARBY_MAX_RESULTS = 1000
+NEARBY_MAX_RADIUS_KM = 20040
+city_coords: Dict[str, Optional[tuple]] = {}
+CITY_COORDS_MAX_ENTRIES = 10000
 
 class WeatherResponse(BaseModel):
-    current: Dict[str, Any]
-    forecast: List[Dict[str, Any]]
+    # Either section may be left out with include=
+    current: Optional[Dict[str, Any]] = None
+    forecast: Optional[List[Dict[str, Any]]] = None
+    stale: bool = False
+    age_seconds: Optional[int] = None
 
 class LocationRegistration(BaseModel):
     chat_id: int
@@ -79,11 +269,28 @@ class LocationRegistration(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
 
+class BatchLocation(BaseModel):
+    city: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+class WeatherBatchRequest(BaseModel):
+    locations: List[BatchLocation]
+
 class AlertResponse(BaseModel):
     message: str
     users_processed: int
     alerts_sent: int
 
+@app.on_event("startup")
+async def preload_users():
+    if user_registry and USER_REGISTRY_PRELOAD:
+        try:
+            loaded = await user_registry.load_all()
+            print(f"Loaded {loaded} users into the registry")
+        except StorageError as e:
+            print(f"Warning: Failed to preload users: {e}")
+
 @app.get("/")
 async def hello_world():
     return {"message": "Hello World from WeatherSphere API"}
@@ -114,52 +321,82 @@ async def version_check(response: Response):
         "message": "CORS headers fixed"
     }
 
-@app.get("/weather", response_model=WeatherResponse)
-async def get_weather(city: str, response: Response):
-    # Add explicit CORS headers
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-    if not OPENWEATHER_API_KEY:
-        raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
+# Helper function to make one OpenWeather call within the API key budget and its circuit breaker
+async def openweather_get(client: httpx.AsyncClient, url: str, params: Dict[str, Any], priority: str = PRIORITY_INTERACTIVE) -> httpx.Response:
+    breaker = upstream_breakers[OPENWEATHER_GEO_URL if url.startswith(OPENWEATHER_GEO_URL) else OPENWEATHER_BASE_URL]
+    breaker.before_call()
+    try:
+        await upstream_quota.acquire(priority)
+    except BaseException:
+        # Includes cancellation: hand back the slot so a half-open probe isn't lost
+        breaker.release()
+        raise
 
-    if not city:
-        raise HTTPException(status_code=400, detail="City parameter is required")
+    started = time.monotonic()
+    try:
+        response = await client.get(url, params=params)
+    except httpx.RequestError:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        # 4xx answers (unknown city, quota) still mean the upstream is up
+        breaker.record_success(time.monotonic() - started)
+    if response.status_code == 429:
+        upstream_quota.exhausted()
+    return response
+
+# Helper function to remember where a city is, dropping the oldest entries past the cap
+def remember_city_coords(key: str, coords: Optional[tuple]):
+    city_coords.pop(key, None)
+    while len(city_coords) >= CITY_COORDS_MAX_ENTRIES:
+        del city_coords[next(iter(city_coords))]
+    city_coords[key] = coords
+
+# Helper function to append current conditions to the location's history
+def record_observation(key: str, current: Dict[str, Any]):
+    try:
+        history_store.record(key, int(current["timestamp"]), tuple(float(current[field]) for field in HISTORY_FIELDS))
+    except Exception as e:
+        print(f"Warning: Failed to record history for {key}: {e}")
 
-    async with httpx.AsyncClient() as client:
+# Helper function to fetch and process weather for a location from OpenWeather
+async def fetch_weather(location_params: Dict[str, Any], label: str, key: Optional[str] = None, priority: str = PRIORITY_INTERACTIVE, with_forecast: bool = True) -> Dict[str, Any]:
+    async with httpx.AsyncClient(timeout=OPENWEATHER_TIMEOUT) as client:
         try:
             # Fetch current weather
             current_url = f"{OPENWEATHER_BASE_URL}/weather"
             current_params = {
-                "q": city,
+                **location_params,
                 "appid": OPENWEATHER_API_KEY,
                 "units": "metric"
             }
 
-            current_response = await client.get(current_url, params=current_params)
+            current_response = await openweather_get(client, current_url, current_params, priority)
             if current_response.status_code != 200:
                 if current_response.status_code == 404:
-                    raise HTTPException(status_code=404, detail=f"City '{city}' not found")
+                    raise HTTPException(status_code=404, detail=f"City '{label}' not found")
                 else:
                     raise HTTPException(status_code=500, detail="Failed to fetch current weather data")
 
-            current_data = current_response.json()
-
-            # Fetch 5-day forecast
-            forecast_url = f"{OPENWEATHER_BASE_URL}/forecast"
-            forecast_params = {
-                "q": city,
-                "appid": OPENWEATHER_API_KEY,
-                "units": "metric"
-            }
+            current_data = fast_json.loads(current_response.content)
 
-            forecast_response = await client.get(forecast_url, params=forecast_params)
-            if forecast_response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Failed to fetch forecast data")
+            # Remember where the city is, so city-only users can be placed in the spatial index
+            if key and "coord" in current_data:
+                remember_city_coords(key, (current_data["coord"]["lat"], current_data["coord"]["lon"]))
 
-            forecast_data = forecast_response.json()
+            # Remember what this spelling resolved to; its history is kept under the canonical key
+            history_key = key
+            location = LocationAlias.from_upstream(current_data)
+            if key and location is not None and not key.startswith("ll:"):
+                if not key.startswith("ow:"):
+                    location_aliases.learn(key, location)
+                history_key = location.key
 
-            # Process and clean the data
             processed_current = {
                 "city": current_data["name"],
                 "country": current_data["sys"]["country"],
@@ -174,54 +411,526 @@ async def get_weather(city: str, response: Response):
                 "visibility": current_data.get("visibility", 0) / 1000,  # Convert to km
                 "timestamp": current_data["dt"]
             }
+            if history_key:
+                record_observation(history_key, processed_current)
 
-            # Process forecast (group by day)
-            forecast_list = []
-            daily_forecasts = {}
-
-            for item in forecast_data["list"]:
-                date = item["dt_txt"].split(" ")[0]
-                if date not in daily_forecasts:
-                    daily_forecasts[date] = {
-                        "date": date,
-                        "temp_min": item["main"]["temp_min"],
-                        "temp_max": item["main"]["temp_max"],
-                        "description": item["weather"][0]["description"],
-                        "icon": item["weather"][0]["icon"],
-                        "humidity": item["main"]["humidity"],
-                        "wind_speed": item["wind"]["speed"],
-                        "times": []
-                    }
-                else:
-                    # Update min/max temps
-                    daily_forecasts[date]["temp_min"] = min(daily_forecasts[date]["temp_min"], item["main"]["temp_min"])
-                    daily_forecasts[date]["temp_max"] = max(daily_forecasts[date]["temp_max"], item["main"]["temp_max"])
-
-                # Add time-specific data
-                daily_forecasts[date]["times"].append({
-                    "time": item["dt_txt"].split(" ")[1],
-                    "temperature": item["main"]["temp"],
-                    "description": item["weather"][0]["description"],
-                    "icon": item["weather"][0]["icon"]
-                })
-
-            # Convert to list and limit to 5 days
-            forecast_list = list(daily_forecasts.values())[:5]
-
-            return WeatherResponse(
-                current=processed_current,
-                forecast=forecast_list
-            )
+            # Current-only callers skip the forecast call entirely
+            if not with_forecast:
+                return {"current": processed_current}
+
+            # Fetch 5-day forecast
+            forecast_url = f"{OPENWEATHER_BASE_URL}/forecast"
+            forecast_params = {
+                **location_params,
+                "appid": OPENWEATHER_API_KEY,
+                "units": "metric"
+            }
+
+            forecast_response = await openweather_get(client, forecast_url, forecast_params, priority)
+            if forecast_response.status_code != 200:
+                raise HTTPException(status_code=500, detail="Failed to fetch forecast data")
 
+            forecast_data = fast_json.loads(forecast_response.content)
+
+            # Daily summaries over local dates, limited to 5 days
+            series = ForecastSeries.from_upstream(forecast_data)
+            forecast_list = series.daily(days=5)
+
+            return {
+                "current": processed_current,
+                "forecast": forecast_list,
+                # Raw 3-hourly columns for /forecast/hourly; never sent to clients as is
+                "series": series.to_columns()
+            }
+
+        except HTTPException:
+            raise
+        except QuotaExceeded:
+            raise HTTPException(status_code=503, detail="Weather service is busy, please try again shortly")
+        except CircuitOpen:
+            raise HTTPException(status_code=503, detail="Weather service is temporarily unavailable")
         except httpx.RequestError:
             raise HTTPException(status_code=500, detail="Failed to connect to weather service")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+# City queries are rejected locally unless they look like a place name: letters first (after an
+# optional apostrophe, as in "'s-Hertogenbosch"), then letters, digits, spaces and the
+# punctuation in names like "St. John's" or "Paris, FR"
+CITY_QUERY_MAX_LENGTH = 100
+CITY_QUERY_PATTERN = re.compile(r"['’]?[^\W\d_][\w\s'’.,()-]*")
+
+# Helper function to reject queries upstream could never answer, before they spend quota
+def validate_location(city: Optional[str], latitude: Optional[float], longitude: Optional[float]):
+    if city is not None:
+        name = city.strip()
+        if not name:
+            raise HTTPException(status_code=400, detail="City name cannot be empty")
+        if len(name) > CITY_QUERY_MAX_LENGTH or "_" in name or not CITY_QUERY_PATTERN.fullmatch(name):
+            raise HTTPException(status_code=400, detail=f"Invalid city name '{name[:CITY_QUERY_MAX_LENGTH]}'")
+    elif latitude is None or longitude is None:
+        raise HTTPException(status_code=400, detail="Either city name or coordinates are required")
+    if latitude is not None and longitude is not None:
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise HTTPException(status_code=400, detail="Coordinates out of range")
+
+# Helper function to pick the alias key, upstream query params and an error label for a city name.
+# Cities in the gazetteer share one key however they are spelled and are queried as "Name,CC".
+def city_query(city: str) -> tuple:
+    match = gazetteer.resolve(city)
+    if match is not None:
+        return "city:" + match.id, {"q": f"{match.name},{match.country}"}, match.label
+    return location_key(city), {"q": city.strip()}, city.strip()
+
+# Helper function to pick the cache key, upstream query params and an error label for a location.
+# A city name OpenWeather has resolved before is looked up by location id under "ow:<id>".
+def upstream_location(city: Optional[str], latitude: Optional[float], longitude: Optional[float]) -> tuple:
+    # Blank names and half coordinates are a 400 here, before they reach location_key
+    validate_location(city, latitude, longitude)
+    if city is not None:
+        alias_key, params, label = city_query(city)
+        location = location_aliases.get(alias_key)
+        if location is not None:
+            return location.key, {"id": location.location_id}, location.label
+        return alias_key, params, label
+    # Query upstream with the same rounding as the cache key
+    key = location_key(None, latitude, longitude)
+    return key, {"lat": round(latitude, 2), "lon": round(longitude, 2)}, f"{latitude}, {longitude}"
+
+# Helper function to store a typed city under its canonical name (gazetteer or resolved alias) when there is one
+def canonical_city(city: str) -> str:
+    alias_key, _, label = city_query(city)
+    if alias_key.startswith("city:"):
+        return label
+    location = location_aliases.get(alias_key)
+    if location is None:
+        return city.strip()
+    # The stored spelling must resolve without another upstream lookup
+    stored_key, _, _ = city_query(location.label)
+    if stored_key != alias_key:
+        location_aliases.learn(stored_key, location)
+    return location.label
+
+# Helper function to serve weather from the shared cache, returning the cache key it came from.
+# Full payloads live under the location key; current-only payloads under "current:" + key.
+async def resolve_weather(
+    city: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    with_forecast: bool = True,
+    priority: str = PRIORITY_INTERACTIVE
+) -> tuple:
+    key, location_params, label = upstream_location(city, latitude, longitude)
+    if weather_cache.is_missing(key):
+        raise HTTPException(status_code=404, detail=f"City '{label}' not found")
+
+    if with_forecast:
+        source_keys = [key]
+    else:
+        # A cached full payload already has the current conditions
+        if weather_cache.get(key) is not None:
+            return key, await weather_cache.get_or_fetch(key, lambda: fetch_weather(location_params, label, key, priority))
+        source_keys = ["current:" + key, key]
+
+    try:
+        weather = await weather_cache.get_or_fetch(
+            source_keys[0],
+            lambda: fetch_weather(location_params, label, key, priority, with_forecast=with_forecast)
+        )
+    except HTTPException as e:
+        if e.status_code == 404:
+            weather_cache.mark_missing(key)
+        if e.status_code < 500:
+            raise
+        # Degraded mode: the last known payload beats an error while upstream is unavailable
+        for source_key in source_keys:
+            last_known = weather_cache.get_stale(source_key)
+            if last_known is not None:
+                stored_at, weather = last_known
+                return source_key, {**weather, "stale": True, "age_seconds": int(time.time() - stored_at)}
+        raise
+
+    # A spelling resolved for the first time: file the payload under its canonical key and serve
+    # it from there, so every spelling shares the entry (and its ETag) from now on
+    if not key.startswith(("ll:", "ow:")):
+        location = location_aliases.get(key)
+        if location is not None:
+            canonical_source = source_keys[0][:-len(key)] + location.key
+            if weather_cache.get(canonical_source) is None:
+                weather_cache.set(canonical_source, weather, weather_cache.stored_at(source_keys[0]))
+            return canonical_source, weather_cache.get(canonical_source)
+    return source_keys[0], weather
+
+# Helper function to serve the full weather payload for a city or coordinates from the shared cache
+async def get_cached_weather(city: Optional[str] = None, latitude: Optional[float] = None, longitude: Optional[float] = None) -> Dict[str, Any]:
+    _, weather = await resolve_weather(city, latitude, longitude)
+    return weather
+
+# Helper function to drop internal fields from a cached payload before returning it whole
+def public_weather(weather: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: value for field, value in weather.items() if field != "series"}
+
+# Helper function to project a weather payload onto the requested sections
+def project_weather(weather: Dict[str, Any], sections: frozenset, times_format: str) -> Dict[str, Any]:
+    body: Dict[str, Any] = {}
+    if "current" in sections:
+        body["current"] = weather["current"]
+    if "daily" in sections or "hourly" in sections:
+        days = []
+        for day in weather["forecast"]:
+            if "daily" in sections:
+                item = {field: value for field, value in day.items() if field != "times"}
+            else:
+                item = {"date": day["date"]}
+            if "hourly" in sections:
+                item["times"] = compact_times(day["times"]) if times_format == "compact" else day["times"]
+            days.append(item)
+        body["forecast"] = days
+    body["stale"] = weather.get("stale", False)
+    body["age_seconds"] = weather.get("age_seconds")
+    return body
+
+# Helper function to array-encode one day's 3-hourly entries: one list per field instead of one dict per step
+def compact_times(times: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    fields = list(times[0].keys()) if times else ["time", "temperature", "description", "icon"]
+    return {field: [step[field] for step in times] for field in fields}
+
+# Helper function to build a strong ETag for one cached snapshot of a location
+def weather_etag(key: str, stored_at: float) -> str:
+    return '"' + hashlib.sha1(f"{key}|{stored_at!r}".encode()).hexdigest()[:24] + '"'
+
+# Helper function to check If-None-Match against the current ETag
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+# Helper function to check whether Accept-Encoding allows gzip; q=0 is a refusal, and an explicit
+# gzip entry takes precedence over "*"
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.lower()] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+# Helper function to compute caching headers for a weather payload served from the cache
+def weather_cache_headers(key: str, weather: Dict[str, Any], private: bool = False, variant: str = "") -> Dict[str, str]:
+    if weather.get("stale"):
+        # Degraded-mode answers must be revalidated so clients pick up fresh data on recovery
+        return {"Cache-Control": "no-cache"}
+
+    now = time.time()
+    stored_at = weather_cache.stored_at(key) or now
+    # The body only changes when our copy is refetched, WEATHER_CACHE_TTL after it was stored;
+    # a client shouldn't keep it past the point upstream publishes the next observation either
+    expires = stored_at + WEATHER_CACHE_TTL
+    observed_at = weather["current"].get("timestamp")
+    if observed_at and observed_at + OPENWEATHER_REFRESH_INTERVAL > now:
+        expires = min(expires, max(observed_at + OPENWEATHER_REFRESH_INTERVAL, stored_at + OPENWEATHER_MIN_MAX_AGE))
+    max_age = max(0, int(expires - now))
+    if private:
+        max_age = min(max_age, DASHBOARD_MAX_AGE)
+
+    headers = {
+        "ETag": weather_etag(key + variant, stored_at),
+        "Cache-Control": f"{'private' if private else 'public'}, max-age={max_age}"
+    }
+    if observed_at:
+        headers["Last-Modified"] = formatdate(observed_at, usegmt=True)
+    return headers
+
+# Helper function to get the encoded /weather body (and its gzip variant) for one snapshot.
+# key identifies the cache entry plus the requested projection.
+def encode_weather(key: str, stored_at: float, build: Callable[[], Dict[str, Any]]) -> tuple:
+    entry = encoded_weather.get(key)
+    if entry is not None and entry[0] == stored_at:
+        return entry[1], entry[2]
+
+    body = fast_json.dumps(build())
+    compressed = gzip.compress(body, compresslevel=ENCODED_WEATHER_GZIP_LEVEL, mtime=0)
+
+    encoded_weather.pop(key, None)
+    while len(encoded_weather) >= ENCODED_WEATHER_MAX_ENTRIES:
+        # Dicts keep insertion order, so this drops the least recently encoded location
+        del encoded_weather[next(iter(encoded_weather))]
+    encoded_weather[key] = (stored_at, body, compressed)
+    return body, compressed
+
+# Helper function to find a registered user by chat_id
+async def find_user_by_chat_id(chat_id: int) -> Optional[Dict[str, Any]]:
+    try:
+        record = await user_registry.get(chat_id)
+    except StorageError:
+        raise HTTPException(status_code=500, detail="Failed to fetch users from database")
+    return record.to_dict() if record else None
+
+@app.get("/weather", response_model=WeatherResponse)
+async def get_weather(
+    response: Response,
+    city: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    chat_id: Optional[int] = None,
+    include: Optional[str] = None,
+    times_format: str = "full",
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    include: comma-separated sections out of current, daily (per-day summaries) and
+    hourly (3-hourly steps per day); everything by default.
+    times_format=compact encodes each day's steps as one array per field.
+    """
+    # Add explicit CORS headers
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response.headers["Access-Control-Expose-Headers"] = "ETag"
+    if not OPENWEATHER_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
+
+    # Resolve a registered user's location (used by the bot's /weather command)
+    if chat_id is not None and not city and lat is None:
+        if not storage:
+            raise HTTPException(status_code=500, detail="Storage not configured")
+        user = await find_user_by_chat_id(chat_id)
+        if not user:
+            raise HTTPException(status_code=404, detail=f"User with chat_id {chat_id} not found")
+        city, lat, lon = user.get("city"), user.get("latitude"), user.get("longitude")
+
+    sections = WEATHER_SECTIONS
+    if include:
+        sections = frozenset(section.strip() for section in include.split(",") if section.strip())
+        if not sections or not sections <= WEATHER_SECTIONS:
+            raise HTTPException(status_code=400, detail="include must list current, daily and/or hourly")
+    if times_format not in ("full", "compact"):
+        raise HTTPException(status_code=400, detail="times_format must be 'full' or 'compact'")
+
+    if not city and (lat is None or lon is None):
+        raise HTTPException(status_code=400, detail="City parameter is required")
+
+    key, weather = await resolve_weather(city, lat, lon, with_forecast=sections != {"current"})
+    variant = "" if sections == WEATHER_SECTIONS and times_format == "full" else f"|{','.join(sorted(sections))}|{times_format}"
+
+    # Lookups by chat_id depend on the user's registration, so only the browser may cache them
+    cache_headers = weather_cache_headers(key, weather, private=chat_id is not None, variant=variant)
+    if "ETag" in cache_headers:
+        use_gzip = accepts_gzip(accept_encoding)
+        if use_gzip:
+            # The compressed variant is a different representation, so it gets its own strong ETag
+            cache_headers["ETag"] = cache_headers["ETag"][:-1] + '-gz"'
+        headers = {**dict(response.headers), **cache_headers, "Vary": "Accept-Encoding"}
+        if etag_matches(if_none_match, cache_headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        body, compressed = encode_weather(
+            key + variant,
+            weather_cache.stored_at(key) or 0.0,
+            lambda: project_weather(weather, sections, times_format)
+        )
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            body = compressed
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    # Stale fallbacks are rare and per-request (age_seconds), so they aren't kept encoded
+    return Response(
+        content=fast_json.dumps(project_weather(weather, sections, times_format)),
+        media_type="application/json",
+        headers={**dict(response.headers), **cache_headers}
+    )
+
+# Helper function to get the interpolated hourly series for one cached snapshot
+def hourly_forecast(key: str, stored_at: float, weather: Dict[str, Any]) -> Dict[str, Any]:
+    entry = hourly_forecasts.get(key)
+    if entry is not None and entry[0] == stored_at:
+        return entry[1]
+
+    series = ForecastSeries.from_columns(weather["series"])
+    hourly = series.interpolate(3600)
+    offset = series.timezone_offset
+    result = {
+        "timezone": offset,
+        "dt": list(hourly["dt"]),
+        "time": [time.strftime("%Y-%m-%d %H:%M", time.gmtime(ts + offset)) for ts in hourly["dt"]],
+        "temperature": [round(value, 2) for value in hourly["temperature"]],
+        "humidity": [round(value) for value in hourly["humidity"]],
+        "wind_speed": [round(value, 2) for value in hourly["wind_speed"]]
+    }
+
+    hourly_forecasts.pop(key, None)
+    while len(hourly_forecasts) >= ENCODED_WEATHER_MAX_ENTRIES:
+        del hourly_forecasts[next(iter(hourly_forecasts))]
+    hourly_forecasts[key] = (stored_at, result)
+    return result
+
+@app.get("/forecast/hourly", response_model=dict)
+async def get_hourly_forecast(
+    response: Response,
+    city: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    hours: int = 48,
+    times_format: str = "full",
+    if_none_match: Optional[str] = Header(None)
+):
+    """Hourly temperature, humidity and wind, linearly interpolated from the 3-hourly forecast"""
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response.headers["Access-Control-Expose-Headers"] = "ETag"
+    if not OPENWEATHER_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
+    if not city and (lat is None or lon is None):
+        raise HTTPException(status_code=400, detail="City parameter is required")
+    if not 1 <= hours <= HOURLY_FORECAST_MAX_HOURS:
+        raise HTTPException(status_code=400, detail=f"hours must be between 1 and {HOURLY_FORECAST_MAX_HOURS}")
+    if times_format not in ("full", "compact"):
+        raise HTTPException(status_code=400, detail="times_format must be 'full' or 'compact'")
+
+    key, weather = await resolve_weather(city, lat, lon)
+    if "series" not in weather and not weather.get("stale"):
+        # Cached before hourly data was kept alongside the payload: refetch once
+        weather_cache.invalidate(key)
+        key, weather = await resolve_weather(city, lat, lon)
+    if "series" not in weather:
+        raise HTTPException(status_code=503, detail="Hourly forecast is temporarily unavailable")
+
+    cache_headers = weather_cache_headers(key, weather, variant=f"|hourly|{hours}|{times_format}")
+    if "ETag" in cache_headers and etag_matches(if_none_match, cache_headers["ETag"]):
+        return Response(status_code=304, headers={**dict(response.headers), **cache_headers})
+    response.headers.update(cache_headers)
+
+    hourly = hourly_forecast(key, weather_cache.stored_at(key) or 0.0, weather)
+    columns = ("dt", "time", "temperature", "humidity", "wind_speed")
+    if times_format == "compact":
+        hours_data: Any = {column: hourly[column][:hours] for column in columns}
+    else:
+        hours_data = [
+            dict(zip(columns, values))
+            for values in zip(*(hourly[column][:hours] for column in columns))
+        ]
+    return {
+        "city": weather["current"]["city"],
+        "timezone": hourly["timezone"],
+        "hours": hours_data,
+        "stale": weather.get("stale", False)
+    }
+
+@app.get("/autocomplete", response_model=dict)
+async def autocomplete(response: Response, q: str = "", limit: int = 10):
+    """Known cities starting with q (accents, case and punctuation ignored), most populous first.
+    Answered from the bundled gazetteer; never calls upstream."""
+    if not 1 <= limit <= AUTOCOMPLETE_MAX_RESULTS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {AUTOCOMPLETE_MAX_RESULTS}")
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return {"query": q, "results": [city.to_dict() for city in gazetteer.complete(q[:CITY_QUERY_MAX_LENGTH], limit)]}
+
+@app.get("/history", response_model=dict)
+async def get_history(
+    city: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    bucket: int = 3600
+):
+    """Observed temperature, humidity, wind and pressure with min/max/mean per bucket of seconds.
+    start/end are unix timestamps; the default range is the last 24 hours."""
+    if not city and (lat is None or lon is None):
+        raise HTTPException(status_code=400, detail="City parameter is required")
+    end = int(time.time()) if end is None else end
+    start = end - 86400 if start is None else start
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if bucket < 60:
+        raise HTTPException(status_code=400, detail="bucket must be at least 60 seconds")
+    if (end - start) / bucket > HISTORY_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"At most {HISTORY_MAX_BUCKETS} buckets per request; use a larger bucket")
+
+    key, _, _ = upstream_location(city, lat, lon)
+    buckets = history_store.downsample(key, start, end, bucket)
+    return {
+        "location": key,
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "observations": sum(item["count"] for item in buckets),
+        "buckets": buckets
+    }
+
+@app.post("/weather/batch")
+async def get_weather_batch(request: WeatherBatchRequest, format: str = "json"):
+    if not OPENWEATHER_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be 'json' or 'ndjson'")
+    if not request.locations:
+        raise HTTPException(status_code=400, detail="At least one location is required")
+    if len(request.locations) > WEATHER_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {WEATHER_BATCH_MAX_ITEMS} locations per batch")
+
+    semaphore = asyncio.Semaphore(WEATHER_BATCH_CONCURRENCY)
+
+    # Each item goes through the cache, so repeated locations share one upstream fetch
+    async def resolve(index: int, location: BatchLocation) -> Dict[str, Any]:
+        item: Dict[str, Any] = {"index": index, "query": location.model_dump(exclude_none=True)}
+        if not location.city and (location.lat is None or location.lon is None):
+            item["error"] = {"status": 400, "detail": "City or lat/lon is required"}
+            return item
+        try:
+            async with semaphore:
+                item["weather"] = public_weather(await get_cached_weather(location.city, location.lat, location.lon))
+        except HTTPException as e:
+            item["error"] = {"status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            # One bad item must not fail the whole batch or cut the stream short
+            item["error"] = {"status": 500, "detail": f"An unexpected error occurred: {str(e)}"}
+        return item
+
+    tasks = [asyncio.ensure_future(resolve(i, location)) for i, location in enumerate(request.locations)]
+
+    if format == "json":
+        results = await asyncio.gather(*tasks)
+        return {
+            "count": len(results),
+            "errors": sum(1 for item in results if "error" in item),
+            "results": results
+        }
+
+    async def stream_results():
+        # Items are written as they complete; "index" ties them back to the request
+        try:
+            for next_item in asyncio.as_completed(tasks):
+                yield fast_json.dumps(await next_item) + b"\n"
+        finally:
+            # Client gone: stop this request's pending items. Upstream loads other requests
+            # share through the cache keep running; ones only this request waited on stop too.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @app.post("/register_location", response_model=dict)
 async def register_location(location: LocationRegistration):
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
 
     # Validate input
     if not location.chat_id:
@@ -229,57 +938,40 @@ async def register_location(location: LocationRegistration):
 
     if not location.city and not (location.latitude and location.longitude):
         raise HTTPException(status_code=400, detail="Either city name or coordinates are required")
+    validate_location(location.city, location.latitude, location.longitude)
 
     try:
         # Check if user already exists
-        existing_user = await supabase.select("users")
-        if existing_user.status_code == 200:
-            users = existing_user.json()
-            existing = next((u for u in users if u.get("chat_id") == location.chat_id), None)
-
-            if existing:
-                # Update existing user
-                user_data = {}
-                if location.city:
-                    user_data["city"] = location.city.strip()
-                if location.latitude is not None:
-                    user_data["latitude"] = location.latitude
-                if location.longitude is not None:
-                    user_data["longitude"] = location.longitude
-
-                # Update user
-                async with httpx.AsyncClient() as client:
-                    update_response = await client.patch(
-                        f"{supabase.url}/rest/v1/users?id=eq.{existing['id']}",
-                        headers=supabase.headers,
-                        json=user_data
-                    )
-
-                print(f"Update response status: {update_response.status_code}")
-                print(f"Update response text: {update_response.text}")
-                print(f"Update user_data: {user_data}")
-                print(f"Existing user ID: {existing['id']}")
-
-                if update_response.status_code in [200, 204]:
-                    # Parse the updated user data from response if available
-                    updated_data = {}
-                    try:
-                        response_json = update_response.json()
-                        if response_json and len(response_json) > 0:
-                            updated_data = response_json[0]
-                    except:
-                        pass
-
-                    return {
-                        "message": f"Updated location for chat_id: {location.chat_id}",
-                        "user_id": existing["id"],
-                        "chat_id": location.chat_id,
-                        "city": location.city or updated_data.get("city") or existing.get("city"),
-                        "latitude": location.latitude or updated_data.get("latitude") or existing.get("latitude"),
-                        "longitude": location.longitude or updated_data.get("longitude") or existing.get("longitude")
-                    }
-                else:
-                    raise HTTPException(status_code=500, detail=f"Failed to update user: {update_response.text}")
+        existing = await find_user_by_chat_id(location.chat_id)
+
+        if existing:
+            # Update existing user
+            user_data = {}
+            if location.city:
+                user_data["city"] = canonical_city(location.city)
+            if location.latitude is not None:
+                user_data["latitude"] = location.latitude
+            if location.longitude is not None:
+                user_data["longitude"] = location.longitude
+
+            updated = await storage.update("users", {"id": existing["id"]}, user_data)
+            if updated:
+                updated_data = updated[0]
+                user_registry.put(updated_data)
+                await index_user(updated_data)
+                user_registry.notify(location.chat_id)
+
+                return {
+                    "message": f"Updated location for chat_id: {location.chat_id}",
+                    "user_id": existing["id"],
+                    "chat_id": location.chat_id,
+                    "city": user_data.get("city") or updated_data.get("city"),
+                    "latitude": location.latitude or updated_data.get("latitude"),
+                    "longitude": location.longitude or updated_data.get("longitude")
+                }
+
+            # The cached row is gone (e.g. another worker deleted it): register from scratch
+            user_registry.invalidate(location.chat_id)
 
         # Create new user record
         user_data = {
@@ -287,31 +979,29 @@ async def register_location(location: LocationRegistration):
         }
 
         if location.city:
-            user_data["city"] = location.city.strip()
+            user_data["city"] = canonical_city(location.city)
         if location.latitude is not None:
             user_data["latitude"] = location.latitude
         if location.longitude is not None:
             user_data["longitude"] = location.longitude
 
-        result = await supabase.insert("users", user_data)
+        created = await storage.insert("users", user_data)
+        user_registry.put(created)
+        await index_user(created)
+        user_registry.notify(location.chat_id)
 
-        if result.status_code == 201:
-            response_data = result.json()
-            if response_data:
-                return {
-                    "message": f"Successfully registered location for chat_id: {location.chat_id}",
-                    "user_id": response_data[0]["id"],
-                    "chat_id": location.chat_id,
-                    "city": location.city,
-                    "latitude": location.latitude,
-                    "longitude": location.longitude
-                }
-            else:
-                raise HTTPException(status_code=500, detail="Failed to register location")
-        else:
-            raise HTTPException(status_code=500, detail=f"Failed to register location: {result.text}")
+        return {
+            "message": f"Successfully registered location for chat_id: {location.chat_id}",
+            "user_id": created["id"],
+            "chat_id": location.chat_id,
+            "city": user_data.get("city"),
+            "latitude": location.latitude,
+            "longitude": location.longitude
+        }
 
     except Exception as e:
+        # The registry may be behind another worker's write; re-read on the next attempt
+        user_registry.invalidate(location.chat_id)
         print(f"ERROR in register_location: {str(e)}")
         print(f"ERROR type: {type(e)}")
         import traceback
@@ -325,111 +1015,467 @@ async def get_user_location(chat_id: int, response: Response):
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
 
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
 
-    try:
-        # Find the user by chat_id
-        existing_user = await supabase.select("users")
-        if existing_user.status_code == 200:
-            users = existing_user.json()
-            existing = next((u for u in users if u.get("chat_id") == chat_id), None)
+    # Find the user by chat_id
+    existing = await find_user_by_chat_id(chat_id)
 
-            if existing:
-                return {
-                    "message": f"Found location for chat_id: {chat_id}",
-                    "chat_id": chat_id,
-                    "user_id": existing["id"],
-                    "city": existing.get("city"),
-                    "latitude": existing.get("latitude"),
-                    "longitude": existing.get("longitude"),
-                    "has_location": bool(existing.get("city") or (existing.get("latitude") and existing.get("longitude")))
-                }
-            else:
-                raise HTTPException(status_code=404, detail=f"User with chat_id {chat_id} not found")
-        else:
-            raise HTTPException(status_code=500, detail="Failed to fetch users from database")
+    if not existing:
+        raise HTTPException(status_code=404, detail=f"User with chat_id {chat_id} not found")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get location: {str(e)}")
+    return {
+        "message": f"Found location for chat_id: {chat_id}",
+        "chat_id": chat_id,
+        "user_id": existing["id"],
+        "city": existing.get("city"),
+        "latitude": existing.get("latitude"),
+        "longitude": existing.get("longitude"),
+        "has_location": bool(existing.get("city") or (existing.get("latitude") and existing.get("longitude")))
+    }
+
+@app.get("/dashboard/{chat_id}", response_model=dict)
+async def get_dashboard(chat_id: int, response: Response):
+    """The user's registered location and its weather in one request, for the web dashboard"""
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+    if not OPENWEATHER_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
+
+    user = await find_user_by_chat_id(chat_id)
+    if not user:
+        raise HTTPException(status_code=404, detail=f"User with chat_id {chat_id} not found")
+
+    city, latitude, longitude = user.get("city"), user.get("latitude"), user.get("longitude")
+    has_location = bool(city or (latitude is not None and longitude is not None))
+    weather, weather_error = None, None
+    if has_location:
+        try:
+            weather = public_weather(await get_cached_weather(city, latitude, longitude))
+        except HTTPException as e:
+            # The location is still useful to the dashboard without weather
+            weather_error = e.detail
+
+    # Errors and stale fallbacks shouldn't be reused once the upstream recovers
+    max_age = DASHBOARD_MAX_AGE if weather and not weather.get("stale") else 0
+    response.headers["Cache-Control"] = f"private, max-age={max_age}"
+    return {
+        "chat_id": chat_id,
+        "location": {
+            "city": city,
+            "latitude": latitude,
+            "longitude": longitude,
+            "has_location": has_location
+        },
+        "weather": weather,
+        "weather_error": weather_error
+    }
 
 @app.delete("/delete_location/{chat_id}", response_model=dict)
 async def delete_user_location(chat_id: int):
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+
+    # Find the user by chat_id
+    existing = await find_user_by_chat_id(chat_id)
+
+    if not existing:
+        raise HTTPException(status_code=404, detail=f"User with chat_id {chat_id} not found")
 
     try:
-        # Find the user by chat_id
-        existing_user = await supabase.select("users")
-        if existing_user.status_code == 200:
-            users = existing_user.json()
-            existing = next((u for u in users if u.get("chat_id") == chat_id), None)
-
-            if existing:
-                # Delete the user's location data
-                async with httpx.AsyncClient() as client:
-                    delete_response = await client.delete(
-                        f"{supabase.url}/rest/v1/users?id=eq.{existing['id']}",
-                        headers=supabase.headers
-                    )
-
-                if delete_response.status_code == 204:
-                    return {
-                        "message": f"Successfully deleted location for chat_id: {chat_id}",
-                        "chat_id": chat_id,
-                        "deleted_user_id": existing["id"]
-                    }
-                else:
-                    raise HTTPException(status_code=500, detail=f"Failed to delete user location: {delete_response.text}")
+        # Delete the user's location data
+        await storage.delete("users", {"id": existing["id"]})
+    except StorageError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete user location: {str(e)}")
+
+    user_registry.remove(chat_id)
+    user_registry.notify(chat_id)
+    spatial_index.remove(chat_id)
+
+    return {
+        "message": f"Successfully deleted location for chat_id: {chat_id}",
+        "chat_id": chat_id,
+        "deleted_user_id": existing["id"]
+    }
+
+# Helper function to guard the bulk endpoints
+def require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Bulk endpoints are disabled (ADMIN_TOKEN not set)")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+# Helper function to validate one imported row into a users record
+def parse_bulk_user(row: Dict[str, Any]) -> Dict[str, Any]:
+    chat_id = int(row["chat_id"])
+    city = (row.get("city") or "").strip() or None
+    latitude = row.get("latitude")
+    longitude = row.get("longitude")
+    latitude = float(latitude) if latitude not in (None, "") else None
+    longitude = float(longitude) if longitude not in (None, "") else None
+
+    # The same checks and canonical city names as /register_location
+    try:
+        validate_location(city, latitude, longitude)
+    except HTTPException as e:
+        raise ValueError(e.detail)
+    if city:
+        city = canonical_city(city)
+
+    # Every row carries the same keys, as PostgREST requires for multi-row inserts
+    return {"chat_id": chat_id, "city": city, "latitude": latitude, "longitude": longitude}
+
+# Helper function to split a streamed request body into lines without buffering it
+async def iter_body_lines(request: Request):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+@app.post("/bulk/users/import", response_model=dict)
+async def bulk_import_users(
+    request: Request,
+    format: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    require_admin(x_admin_token)
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+
+    # NDJSON (one object per line) or CSV with a header row; one record per line
+    content_type = request.headers.get("content-type", "")
+    is_csv = format == "csv" or (format is None and "csv" in content_type)
+
+    rows_received = 0
+    rows_imported = 0
+    rows_duplicate = 0
+    errors = []
+    batch: Dict[int, Dict[str, Any]] = {}
+    inflight = set()
+
+    async def upload(rows: List[Dict[str, Any]]):
+        return await storage.upsert("users", rows, on_conflict="chat_id")
+
+    async def collect(done):
+        nonlocal rows_imported
+        for task in done:
+            try:
+                rows_imported += task.result()
+            except Exception as e:
+                errors.append(str(e))
+
+    header = None
+    async for line in iter_body_lines(request):
+        if not line.strip():
+            continue
+        if is_csv and header is None:
+            header = [h.strip() for h in next(csv.reader([line]))]
+            continue
+
+        rows_received += 1
+        try:
+            if is_csv:
+                row = dict(zip(header, next(csv.reader([line]))))
             else:
-                raise HTTPException(status_code=404, detail=f"User with chat_id {chat_id} not found")
-        else:
-            raise HTTPException(status_code=500, detail="Failed to fetch users from database")
+                row = fast_json.loads(line)
+            user = parse_bulk_user(row)
+        except Exception as e:
+            if len(errors) < 20:
+                errors.append(f"Row {rows_received}: {str(e)}")
+            continue
+
+        # Keyed by chat_id: a batch may not touch the same row twice, so the later row wins
+        if user["chat_id"] in batch:
+            rows_duplicate += 1
+        batch[user["chat_id"]] = user
+        if len(batch) >= BULK_BATCH_SIZE:
+            inflight.add(asyncio.create_task(upload(list(batch.values()))))
+            batch = {}
+            # Keep a few batches in flight while the body keeps streaming in
+            if len(inflight) >= BULK_MAX_INFLIGHT:
+                done, inflight = await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                await collect(done)
+
+    if batch:
+        inflight.add(asyncio.create_task(upload(list(batch.values()))))
+    if inflight:
+        done, _ = await asyncio.wait(inflight)
+        await collect(done)
+
+    # Imported rows may overwrite anything the registry holds
+    user_registry.invalidate()
+    user_registry.notify(None)
+    spatial_index_state["ready"] = False
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete location: {str(e)}")
+    return {
+        "message": f"Imported {rows_imported} of {rows_received} rows",
+        "rows_received": rows_received,
+        "rows_imported": rows_imported,
+        "rows_duplicate": rows_duplicate,
+        "rows_rejected": rows_received - rows_imported - rows_duplicate,
+        "errors": errors[:20]
+    }
+
+@app.get("/bulk/users/export")
+async def bulk_export_users(
+    format: str = "ndjson",
+    x_admin_token: Optional[str] = Header(None)
+):
+    require_admin(x_admin_token)
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be 'ndjson' or 'csv'")
+
+    def encode_page(rows: List[Dict[str, Any]]) -> bytes:
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerows([[row.get(c) if row.get(c) is not None else "" for c in USER_EXPORT_COLUMNS] for row in rows])
+            return buffer.getvalue().encode("utf-8")
+        return b"".join(fast_json.dumps({c: row.get(c) for c in USER_EXPORT_COLUMNS}) + b"\n" for row in rows)
+
+    async def stream_pages():
+        if format == "csv":
+            yield ",".join(USER_EXPORT_COLUMNS) + "\n"
+
+        pages = storage.paginate("users", ",".join(USER_EXPORT_COLUMNS), BULK_BATCH_SIZE)
+        next_page = asyncio.ensure_future(pages.__anext__())
+        try:
+            while True:
+                try:
+                    rows = await next_page
+                except StopAsyncIteration:
+                    return
+                except StorageError as e:
+                    # Headers are already sent, so the only signal left is a truncated body
+                    print(f"ERROR in bulk_export_users: {str(e)}")
+                    return
+
+                # Fetch the following page while this one is being written out
+                next_page = asyncio.ensure_future(pages.__anext__())
+                yield encode_page(rows)
+        finally:
+            next_page.cancel()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_pages(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=users.{format}"}
+    )
+
+# Helper function to resolve a city name to coordinates (gazetteer, resolved aliases, weather cache, then geocoding)
+async def resolve_city_coords(city: str) -> Optional[tuple]:
+    match = gazetteer.resolve(city)
+    if match is not None:
+        return match.latitude, match.longitude
+    location = location_aliases.get(location_key(city))
+    if location is not None:
+        return location.latitude, location.longitude
+    key = location_key(city)
+    if key in city_coords:
+        return city_coords[key]
+
+    async with httpx.AsyncClient(timeout=OPENWEATHER_TIMEOUT) as client:
+        response = await openweather_get(
+            client,
+            f"{OPENWEATHER_GEO_URL}/direct",
+            {"q": city.strip(), "limit": 1, "appid": OPENWEATHER_API_KEY},
+            PRIORITY_BACKGROUND
+        )
+    if response.status_code != 200:
+        # Transient failure: don't remember it
+        return None
+    results = fast_json.loads(response.content)
+    remember_city_coords(key, (results[0]["lat"], results[0]["lon"]) if results else None)
+    return city_coords[key]
+
+# Helper function to place one user in the spatial index
+async def index_user(user: Dict[str, Any]):
+    if not spatial_index_state["ready"]:
+        return
+    if user.get("latitude") is not None and user.get("longitude") is not None:
+        spatial_index.insert(user["chat_id"], float(user["latitude"]), float(user["longitude"]))
+        return
+    coords = None
+    if user.get("city") and OPENWEATHER_API_KEY:
+        try:
+            coords = await resolve_city_coords(user["city"])
+        except Exception as e:
+            # The user row is already written; a geocoding failure only leaves them out of the index
+            print(f"Warning: Failed to geocode '{user['city']}': {e}")
+    if coords:
+        spatial_index.insert(user["chat_id"], coords[0], coords[1])
+    else:
+        spatial_index.remove(user["chat_id"])
+
+# Helper function to build the spatial index from storage on first use
+async def ensure_spatial_index():
+    if spatial_index_state["ready"]:
+        return
+    if spatial_index_state["lock"] is None:
+        spatial_index_state["lock"] = asyncio.Lock()
+
+    async with spatial_index_state["lock"]:
+        if spatial_index_state["ready"]:
+            return
+        spatial_index.clear()
+        city_users: Dict[str, List[int]] = {}
+
+        async for rows in storage.paginate("users", "id,chat_id,city,latitude,longitude"):
+            for row in rows:
+                if row.get("latitude") is not None and row.get("longitude") is not None:
+                    spatial_index.insert(row["chat_id"], float(row["latitude"]), float(row["longitude"]))
+                elif row.get("city"):
+                    city_users.setdefault(row["city"], []).append(row["chat_id"])
+
+        # One coordinate lookup per distinct city, a few at a time
+        semaphore = asyncio.Semaphore(5)
+
+        async def place_city(city: str, chat_ids: List[int]):
+            async with semaphore:
+                try:
+                    coords = await resolve_city_coords(city)
+                except Exception as e:
+                    print(f"Warning: Failed to geocode '{city}': {e}")
+                    coords = None
+            if coords:
+                for chat_id in chat_ids:
+                    spatial_index.insert(chat_id, coords[0], coords[1])
+
+        if city_users and OPENWEATHER_API_KEY:
+            await asyncio.gather(*(place_city(city, ids) for city, ids in city_users.items()))
+        spatial_index_state["ready"] = True
+
+@app.get("/users/nearby", response_model=dict)
+async def users_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=NEARBY_MAX_RADIUS_KM),
+    limit: int = Query(NEARBY_MAX_RESULTS, ge=1, le=NEARBY_MAX_RESULTS),
+    x_admin_token: Optional[str] = Header(None)
+):
+    require_admin(x_admin_token)
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+
+    await ensure_spatial_index()
+    matches = spatial_index.within_radius(lat, lon, radius_km, limit)
+    return {
+        "count": len(matches),
+        "users": [{"chat_id": chat_id, "distance_km": round(distance, 2)} for chat_id, distance in matches]
+    }
+
+@app.get("/users/in_bbox", response_model=dict)
+async def users_in_bbox(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    x_admin_token: Optional[str] = Header(None)
+):
+    require_admin(x_admin_token)
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+
+    # min_lon > max_lon selects a box that crosses the antimeridian
+    await ensure_spatial_index()
+    chat_ids = spatial_index.within_bbox(min_lat, min_lon, max_lat, max_lon)
+    return {
+        "count": len(chat_ids),
+        "chat_ids": chat_ids
+    }
+
+@app.post("/internal/users/invalidate", response_model=dict)
+async def invalidate_users(
+    chat_id: Optional[int] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    # Hook for multi-worker deployments: peers call this after changing a user
+    require_admin(x_admin_token)
+    if not user_registry:
+        raise HTTPException(status_code=500, detail="Storage not configured")
+
+    user_registry.invalidate(chat_id)
+    if chat_id is None:
+        spatial_index_state["ready"] = False
+    return {"message": "Invalidated all users" if chat_id is None else f"Invalidated chat_id: {chat_id}"}
+
+@app.get("/internal/stats", response_model=dict)
+async def internal_stats():
+    return {
+        "weather_cache": weather_cache.stats(),
+        "encoded_weather": {"entries": len(encoded_weather), "max_entries": ENCODED_WEATHER_MAX_ENTRIES},
+        "history": history_store.stats(),
+        "location_aliases": location_aliases.stats(),
+        "user_registry": user_registry.stats() if user_registry else None,
+        "spatial_index": {"ready": spatial_index_state["ready"], "users": len(spatial_index)},
+        "upstream_quota": upstream_quota.stats(),
+        "upstream_circuits": {breaker.name: breaker.stats() for breaker in upstream_breakers.values()}
+    }
 
 @app.post("/send_alerts", response_model=AlertResponse)
 async def send_weather_alerts():
-    if not supabase:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
+    if not storage:
+        raise HTTPException(status_code=500, detail="Storage not configured")
 
     try:
-        # Fetch all users from database
-        users_result = await supabase.select("users")
-
-        if users_result.status_code != 200:
+        # Load users into a compact columnar snapshot rather than a list of full rows
+        try:
+            snapshot = await UserSnapshot.from_storage(storage)
+        except StorageError:
             raise HTTPException(status_code=500, detail="Failed to fetch users from database")
 
-        users = users_result.json()
-
-        if not users:
+        if not len(snapshot):
             return AlertResponse(
                 message="No users found in database",
                 users_processed=0,
                 alerts_sent=0
             )
 
-        users_processed = len(users)
-        alerts_sent = 0
-
-        for user in users:
-            try:
-                # Get weather for user's city
-                weather = await get_weather_for_city(user["city"])
-
-                # Check if weather conditions warrant an alert
-                if should_send_alert(weather):
-                    # Log alert (in production, this would send to Telegram)
-                    print(f"🚨 Weather Alert for {user['city']}:")
-                    print(f"   Conditions: {weather['current']['description']}")
-                    print(f"   Temperature: {weather['current']['temperature']}°C")
-                    print(f"   User ID: {user['id']}")
-                    alerts_sent += 1
-
-            except Exception as e:
-                print(f"Failed to process alerts for user {user['id']}: {str(e)}")
-                continue
+        users_processed = len(snapshot)
+        users_by_location = snapshot.users_by_location()
+        semaphore = asyncio.Semaphore(ALERT_SWEEP_CONCURRENCY)
+
+        # Weather is fetched once per distinct location, not once per user
+        async def check_location(location_id: int, key: str, args: tuple) -> int:
+            async with semaphore:
+                try:
+                    weather = await get_weather_for_city(*args)
+                except Exception as e:
+                    print(f"Failed to process alerts for {key}: {str(e)}")
+                    return 0
+
+            rows = users_by_location[location_id]
+            rule_counts = Counter(snapshot.rule_ids[row] for row in rows)
+            alerted = sum(count for rule_id, count in rule_counts.items() if ALERT_RULES[rule_id](weather))
+
+            if alerted:
+                # Log alert (in production, this would send to Telegram)
+                print(f"🚨 Weather Alert for {weather['current']['city']}:")
+                print(f"   Conditions: {weather['current']['description']}")
+                print(f"   Temperature: {weather['current']['temperature']}°C")
+                print(f"   Users: {alerted}")
+            return alerted
+
+        results = await asyncio.gather(*(
+            check_location(location_id, key, args)
+            for location_id, key, args in snapshot.iter_locations()
+        ))
+        alerts_sent = sum(results)
 
         return AlertResponse(
             message=f"Weather alerts processed for {users_processed} users",
@@ -437,35 +1483,20 @@ async def send_weather_alerts():
             alerts_sent=alerts_sent
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send alerts: {str(e)}")
 
-# Helper function to get weather for a city (reused from existing code)
-async def get_weather_for_city(city: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient() as client:
-        current_url = f"{OPENWEATHER_BASE_URL}/weather"
-        current_params = {
-            "q": city,
-            "appid": OPENWEATHER_API_KEY,
-            "units": "metric"
-        }
-
-        current_response = await client.get(current_url, params=current_params)
-        if current_response.status_code != 200:
-            raise Exception(f"Failed to fetch weather for {city}")
-
-        current_data = current_response.json()
-
-        return {
-            "current": {
-                "city": current_data["name"],
-                "temperature": current_data["main"]["temp"],
-                "description": current_data["weather"][0]["description"],
-                "humidity": current_data["main"]["humidity"],
-                "wind_speed": current_data["wind"]["speed"],
-                "pressure": current_data["main"]["pressure"]
-            }
-        }
+# Helper function to get current weather for a city or coordinates (alert sweep)
+async def get_weather_for_city(city: Optional[str] = None, latitude: Optional[float] = None, longitude: Optional[float] = None) -> Dict[str, Any]:
+    # Shares current-only entries with /weather?include=current; a cached full payload is used as is.
+    # Sweeps are background work: locations beyond the free budget are skipped this round.
+    _, weather = await resolve_weather(city, latitude, longitude, with_forecast=False, priority=PRIORITY_BACKGROUND)
+    if weather.get("stale"):
+        # Don't alert on old conditions
+        raise Exception(f"Weather for {location_key(city, latitude, longitude)} is unavailable")
+    return {"current": weather["current"]}
 
 # Helper function to determine if weather warrants an alert
 def should_send_alert(weather: Dict[str, Any]) -> bool:
@@ -490,6 +1521,11 @@ def should_send_alert(weather: Dict[str, Any]) -> bool:
 
     return any(alert_conditions)
 
+# Alert rules by rule id (UserSnapshot.rule_ids); every user currently gets the default rule
+ALERT_RULES = {
+    DEFAULT_RULE: should_send_alert
+}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
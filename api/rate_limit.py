@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def time_until(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` would be available (0 if they already are)"""
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (tokens - self.tokens) / self.rate
+
+# Reasons returned by ChatRateLimiter.check
+RATE_LIMITED = "rate_limited"
+DEBOUNCED = "debounced"
+
+class ChatRateLimiter:
+    """Per-chat token buckets plus debouncing of repeated commands"""
+
+    def __init__(self, rate: float, burst: float, debounce_seconds: float, max_chats: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.debounce_seconds = debounce_seconds
+        self.max_chats = max_chats
+        self.buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self.last_commands: Dict[Tuple[Hashable, str], float] = {}
+        self.warned_at: Dict[Hashable, float] = {}
+
+    def _bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.buckets[chat_id] = TokenBucket(self.rate, self.burst)
+            # Forget the least recently seen chats so memory stays bounded
+            while len(self.buckets) > self.max_chats:
+                old_chat, _ = self.buckets.popitem(last=False)
+                self.warned_at.pop(old_chat, None)
+        else:
+            self.buckets.move_to_end(chat_id)
+        return bucket
+
+    def check(self, chat_id: Hashable, command: Optional[str] = None) -> Optional[str]:
+        """Return None if the update may be handled, otherwise the reason it was dropped"""
+        now = time.monotonic()
+
+        if command:
+            key = (chat_id, command)
+            last = self.last_commands.get(key)
+            if last is not None and now - last < self.debounce_seconds:
+                return DEBOUNCED
+            if len(self.last_commands) > self.max_chats:
+                self.last_commands = {k: t for k, t in self.last_commands.items() if now - t < self.debounce_seconds}
+
+        if not self._bucket(chat_id).try_acquire():
+            return RATE_LIMITED
+
+        if command:
+            self.last_commands[(chat_id, command)] = now
+        return None
+
+    def should_warn(self, chat_id: Hashable, interval: float = 30.0) -> bool:
+        """True at most once per `interval` seconds per chat, to avoid replying to every dropped update"""
+        now = time.monotonic()
+        last = self.warned_at.get(chat_id)
+        if last is not None and now - last < interval:
+            return False
+        self.warned_at[chat_id] = now
+        return True
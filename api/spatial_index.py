@@ -0,0 +1,114 @@
+import math
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Grid-bucket spatial index over user coordinates, used to map a storm cell or
+# warning area to the users inside it without scanning the users table.
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def normalize_lon(lon: float) -> float:
+    return ((lon + 180.0) % 360.0) - 180.0
+
+class SpatialIndex:
+    def __init__(self, cell_degrees: float = 1.0):
+        self.cell_degrees = cell_degrees
+        self.rows = int(math.ceil(180.0 / cell_degrees))
+        self.cols = int(math.ceil(360.0 / cell_degrees))
+        self.buckets: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        self.points: Dict[Hashable, Tuple[int, int]] = {}
+
+    def clear(self):
+        self.buckets.clear()
+        self.points.clear()
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _row(self, lat: float) -> int:
+        return min(self.rows - 1, max(0, int((lat + 90.0) // self.cell_degrees)))
+
+    def _col(self, lon: float) -> int:
+        return self._col_bound(normalize_lon(lon))
+
+    def _col_bound(self, lon: float) -> int:
+        # Range bounds are already in [-180, 180]; +180 must stay in the last column
+        return min(self.cols - 1, max(0, int((lon + 180.0) // self.cell_degrees)))
+
+    def insert(self, key: Hashable, lat: float, lon: float):
+        self.remove(key)
+        cell = (self._row(lat), self._col(lon))
+        self.buckets.setdefault(cell, {})[key] = (lat, normalize_lon(lon))
+        self.points[key] = cell
+
+    def remove(self, key: Hashable):
+        cell = self.points.pop(key, None)
+        if cell is None:
+            return
+        bucket = self.buckets[cell]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[cell]
+
+    def _lon_ranges(self, min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
+        if max_lon - min_lon >= 360.0:
+            return [(-180.0, 180.0)]
+        min_lon, max_lon = normalize_lon(min_lon), normalize_lon(max_lon)
+        if min_lon <= max_lon:
+            return [(min_lon, max_lon)]
+        # Box crosses the antimeridian
+        return [(min_lon, 180.0), (-180.0, max_lon)]
+
+    def _candidates(self, min_lat: float, max_lat: float, lon_ranges: List[Tuple[float, float]]):
+        row_range = range(self._row(min_lat), self._row(max_lat) + 1)
+        col_ranges = [range(self._col_bound(lo), self._col_bound(hi) + 1) for lo, hi in lon_ranges]
+        cell_count = len(row_range) * sum(len(c) for c in col_ranges)
+
+        if cell_count > len(self.buckets):
+            # Large areas: walk the occupied buckets instead of every grid cell
+            for (row, col), bucket in self.buckets.items():
+                if row in row_range and any(col in c for c in col_ranges):
+                    yield from bucket.items()
+            return
+
+        for row in row_range:
+            for cols in col_ranges:
+                for col in cols:
+                    bucket = self.buckets.get((row, col))
+                    if bucket:
+                        yield from bucket.items()
+
+    def within_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Hashable]:
+        """Keys inside the box; min_lon > max_lon means the box crosses the antimeridian"""
+        lon_ranges = self._lon_ranges(min_lon, max_lon)
+        return [
+            key for key, (lat, lon) in self._candidates(min_lat, max_lat, lon_ranges)
+            if min_lat <= lat <= max_lat and any(lo <= lon <= hi for lo, hi in lon_ranges)
+        ]
+
+    def within_radius(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """(key, distance_km) pairs within radius_km of the point, nearest first"""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+
+        if min_lat <= -90.0 or max_lat >= 90.0:
+            lon_ranges = [(-180.0, 180.0)]
+        else:
+            # Widest longitude span of the circle (at its tangent latitude)
+            ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+            dlon = 180.0 if ratio >= 1.0 else math.degrees(math.asin(ratio))
+            lon_ranges = self._lon_ranges(lon - dlon, lon + dlon)
+
+        matches = []
+        for key, (point_lat, point_lon) in self._candidates(min_lat, max_lat, lon_ranges):
+            distance = haversine_km(lat, lon, point_lat, point_lon)
+            if distance <= radius_km:
+                matches.append((key, distance))
+        matches.sort(key=lambda m: m[1])
+        return matches[:limit] if limit is not None else matches
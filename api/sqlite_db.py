@@ -0,0 +1,16 @@
+import sqlite3
+
+# Connection setup shared by the local SQLite files (users, weather cache, history, aliases).
+# All of them are queried inline on the event loop and may be opened by several workers at
+# once: WAL lets readers run alongside a writer, synchronous=NORMAL skips the fsync per commit,
+# and a short busy timeout makes a locked file fail fast instead of stalling every request.
+
+SQLITE_BUSY_TIMEOUT = 1.0
+
+def connect_sqlite(path: str, schema: str) -> sqlite3.Connection:
+    """Open path in autocommit WAL mode and create schema if it is missing"""
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(schema)
+    return conn
@@ -0,0 +1,310 @@
+import asyncio
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+import fast_json
+from sqlite_db import connect_sqlite
+
+# Storage backends for the users table.
+# STORAGE_BACKEND=supabase (default) talks to PostgREST over HTTP,
+# STORAGE_BACKEND=sqlite keeps everything in a local WAL-mode database file.
+
+class StorageError(Exception):
+    pass
+
+class StorageBackend(ABC):
+    """Interface shared by all backends. Filters are column -> value equality matches."""
+
+    name = "base"
+
+    @abstractmethod
+    async def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def select(self, table: str, filters: Optional[Dict[str, Any]] = None, columns: str = "*", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def update(self, table: str, filters: Dict[str, Any], data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def upsert(self, table: str, rows: List[Dict[str, Any]], on_conflict: str) -> int:
+        ...
+
+    @abstractmethod
+    async def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def paginate(self, table: str, columns: str = "*", page_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield pages ordered by id using keyset pagination"""
+        ...
+
+# Simple Supabase HTTP client
+class SupabaseClient(StorageBackend):
+    name = "supabase"
+
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+        self.headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+            "Prefer": "return=representation"
+        }
+        self.client: Optional[httpx.AsyncClient] = None
+        self.client_loop = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # One pooled client per event loop; building an AsyncClient (and its SSL
+        # context) per request costs more than the request itself
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client_loop is not loop:
+            self.client = httpx.AsyncClient(timeout=60.0)
+            self.client_loop = loop
+        return self.client
+
+    def _filter_params(self, filters: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        return {column: f"eq.{value}" for column, value in (filters or {}).items()}
+
+    async def _request(self, method: str, table: str, action: str, **kwargs) -> httpx.Response:
+        if "json" in kwargs:
+            kwargs["content"] = fast_json.dumps(kwargs.pop("json"))
+        try:
+            response = await self._http().request(method, f"{self.url}/rest/v1/{table}", **kwargs)
+        except httpx.RequestError as e:
+            raise StorageError(f"Failed to {action}: {str(e)}")
+        if response.status_code not in (200, 201, 204):
+            raise StorageError(f"Failed to {action}: {response.text}")
+        return response
+
+    async def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._request(
+            "POST", table, f"insert into {table}",
+            headers=self.headers,
+            json=data
+        )
+        rows = fast_json.loads(response.content)
+        if not rows:
+            raise StorageError(f"Insert into {table} returned no rows")
+        return rows[0]
+
+    async def select(self, table: str, filters: Optional[Dict[str, Any]] = None, columns: str = "*", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        params = {"select": columns, **self._filter_params(filters)}
+        if limit is not None:
+            params["limit"] = str(limit)
+        response = await self._request(
+            "GET", table, f"select from {table}",
+            params=params,
+            headers=self.headers
+        )
+        return fast_json.loads(response.content)
+
+    async def update(self, table: str, filters: Dict[str, Any], data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        response = await self._request(
+            "PATCH", table, f"update {table}",
+            params=self._filter_params(filters),
+            headers=self.headers,
+            json=data
+        )
+        return fast_json.loads(response.content) if response.status_code == 200 and response.content else []
+
+    async def upsert(self, table: str, rows: List[Dict[str, Any]], on_conflict: str) -> int:
+        # Multi-row insert that merges into existing rows on the conflict column
+        response = await self._request(
+            "POST", table, f"upsert into {table}",
+            params={"on_conflict": on_conflict},
+            headers={**self.headers, "Prefer": "resolution=merge-duplicates,return=minimal"},
+            json=rows
+        )
+        return len(rows)
+
+    async def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        response = await self._request(
+            "DELETE", table, f"delete from {table}",
+            params=self._filter_params(filters),
+            headers=self.headers
+        )
+        return fast_json.loads(response.content) if response.status_code == 200 and response.content else []
+
+    async def paginate(self, table: str, columns: str = "*", page_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        # Keyset pagination on id, so deep pages cost the same as the first one
+        if columns != "*" and "id" not in columns.split(","):
+            columns = "id," + columns
+        after_id = 0
+        while True:
+            response = await self._request(
+                "GET", table, f"page through {table}",
+                params={
+                    "select": columns,
+                    "id": f"gt.{after_id}",
+                    "order": "id.asc",
+                    "limit": str(page_size)
+                },
+                headers=self.headers
+            )
+            rows = fast_json.loads(response.content)
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after_id = rows[-1]["id"]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER UNIQUE,
+    city TEXT,
+    latitude REAL,
+    longitude REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_users_chat_id ON users(chat_id);
+"""
+
+class SQLiteBackend(StorageBackend):
+    """Embedded backend for local load testing and small deployments.
+
+    Queries hit indexed columns and finish in microseconds, so they run inline
+    on the event loop instead of paying for a thread hop per call.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = connect_sqlite(path, SQLITE_SCHEMA)
+        self.conn.row_factory = sqlite3.Row
+        self.columns: Dict[str, List[str]] = {}
+
+    def _table_columns(self, table: str) -> List[str]:
+        if table not in self.columns:
+            rows = self.conn.execute(f"PRAGMA table_info({table})").fetchall()
+            if not rows:
+                raise StorageError(f"Unknown table '{table}'")
+            self.columns[table] = [row["name"] for row in rows]
+        return self.columns[table]
+
+    def _checked(self, table: str, columns) -> List[str]:
+        # Column names are interpolated into SQL, so only known ones are allowed
+        known = self._table_columns(table)
+        unknown = [c for c in columns if c not in known]
+        if unknown:
+            raise StorageError(f"Unknown column(s) for {table}: {', '.join(unknown)}")
+        return list(columns)
+
+    def _select_list(self, table: str, columns: str) -> str:
+        if columns == "*":
+            return "*"
+        return ", ".join(self._checked(table, columns.split(",")))
+
+    def _where(self, table: str, filters: Optional[Dict[str, Any]]):
+        if not filters:
+            return "", []
+        columns = self._checked(table, filters.keys())
+        return " WHERE " + " AND ".join(f"{c} = ?" for c in columns), list(filters.values())
+
+    async def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        columns = self._checked(table, data.keys())
+        try:
+            cursor = self.conn.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) RETURNING *",
+                list(data.values())
+            )
+            return dict(cursor.fetchone())
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to insert into {table}: {str(e)}")
+
+    async def select(self, table: str, filters: Optional[Dict[str, Any]] = None, columns: str = "*", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        where, values = self._where(table, filters)
+        sql = f"SELECT {self._select_list(table, columns)} FROM {table}{where} ORDER BY id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        try:
+            return [dict(row) for row in self.conn.execute(sql, values)]
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to select from {table}: {str(e)}")
+
+    async def update(self, table: str, filters: Dict[str, Any], data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        columns = self._checked(table, data.keys())
+        where, values = self._where(table, filters)
+        try:
+            cursor = self.conn.execute(
+                f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)}{where} RETURNING *",
+                list(data.values()) + values
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to update {table}: {str(e)}")
+
+    async def upsert(self, table: str, rows: List[Dict[str, Any]], on_conflict: str) -> int:
+        if not rows:
+            return 0
+        columns = self._checked(table, rows[0].keys())
+        conflict = self._checked(table, [on_conflict])[0]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != conflict)
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT({conflict}) DO UPDATE SET {updates}"
+        )
+        try:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(sql, [[row.get(c) for c in columns] for row in rows])
+            self.conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            self.conn.execute("ROLLBACK")
+            raise StorageError(f"Failed to upsert into {table}: {str(e)}")
+        return len(rows)
+
+    async def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        where, values = self._where(table, filters)
+        try:
+            cursor = self.conn.execute(f"DELETE FROM {table}{where} RETURNING *", values)
+            return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise StorageError(f"Failed to delete from {table}: {str(e)}")
+
+    async def paginate(self, table: str, columns: str = "*", page_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        if columns != "*" and "id" not in columns.split(","):
+            columns = "id," + columns
+        select_list = self._select_list(table, columns)
+        after_id = 0
+        while True:
+            try:
+                rows = [dict(row) for row in self.conn.execute(
+                    f"SELECT {select_list} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                    (after_id, page_size)
+                )]
+            except sqlite3.Error as e:
+                raise StorageError(f"Failed to paginate {table}: {str(e)}")
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after_id = rows[-1]["id"]
+
+def create_storage() -> Optional[StorageBackend]:
+    """Build the backend selected by STORAGE_BACKEND, or None if it isn't configured"""
+    backend = os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+    if backend == "sqlite":
+        path = os.getenv("SQLITE_PATH", "weathersphere.db")
+        print(f"Using SQLite storage at {path}")
+        return SQLiteBackend(path)
+
+    if backend != "supabase":
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'")
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if url and key and not url.startswith("your_"):
+        print("Supabase client initialized successfully")
+        return SupabaseClient(url, key)
+    return None
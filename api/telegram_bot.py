@@ -2,10 +2,11 @@ import asyncio
 import logging
 import os
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, InlineQueryHandler, TypeHandler, ApplicationHandlerStop
 import httpx
 import json
+from rate_limit import ChatRateLimiter, RATE_LIMITED
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +14,8 @@ load_dotenv()
 # Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+# Optional Bot API endpoint override (e.g. the local fake server used for load tests)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
 
 # Configure logging
 logging.basicConfig(
@@ -21,9 +24,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Per-chat flood protection: sustained updates/sec, burst size and repeat-command debounce window
+BOT_RATE_LIMIT = float(os.getenv("BOT_RATE_LIMIT", 0.5))
+BOT_RATE_BURST = float(os.getenv("BOT_RATE_BURST", 5))
+BOT_COMMAND_DEBOUNCE = float(os.getenv("BOT_COMMAND_DEBOUNCE", 3))
+# Inline queries arrive once per keystroke, so they get their own, roomier per-user budget
+BOT_INLINE_RATE_LIMIT = float(os.getenv("BOT_INLINE_RATE_LIMIT", 2))
+BOT_INLINE_RATE_BURST = float(os.getenv("BOT_INLINE_RATE_BURST", 10))
+
 # Store user states
 user_states = {}
 
+rate_limiter = ChatRateLimiter(BOT_RATE_LIMIT, BOT_RATE_BURST, BOT_COMMAND_DEBOUNCE)
+inline_rate_limiter = ChatRateLimiter(BOT_INLINE_RATE_LIMIT, BOT_INLINE_RATE_BURST, 0)
+
+async def flood_guard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Drop updates from chats that exceed their rate limit before any handler runs"""
+    if update.inline_query:
+        # Not tied to a chat: limited per user, and a dropped query still gets an (empty) answer
+        if inline_rate_limiter.check(update.inline_query.from_user.id) is None:
+            return
+        logger.warning(f"Dropped inline query from user {update.inline_query.from_user.id}")
+        await update.inline_query.answer([], cache_time=0)
+        raise ApplicationHandlerStop
+
+    chat = update.effective_chat
+    user = update.effective_user
+    key = chat.id if chat else (user.id if user else None)
+    if key is None:
+        return
+
+    # Repeated commands and button presses are debounced, other messages only rate limited.
+    # Arguments are part of the command: "/weather Paris" then "/weather Tokyo" both go through.
+    command = None
+    if update.message and update.message.text and update.message.text.startswith('/'):
+        name, *args = update.message.text.lower().split()
+        command = " ".join([name.split('@')[0], *args])
+    elif update.callback_query:
+        command = f"callback:{update.callback_query.data}"
+
+    reason = rate_limiter.check(key, command)
+    if reason is None:
+        return
+
+    logger.warning(f"Dropped update from chat {key}: {reason}")
+    if update.callback_query:
+        # Stop the button spinner without touching the API
+        await update.callback_query.answer()
+    elif reason == RATE_LIMITED and update.message and rate_limiter.should_warn(key):
+        await update.message.reply_text("⏳ You're sending messages too fast. Please wait a moment and try again.")
+    raise ApplicationHandlerStop
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     chat_id = update.effective_chat.id
@@ -231,6 +282,113 @@ async def changelocation_command(update: Update, context: ContextTypes.DEFAULT_T
         reply_markup=reply_markup
     )
 
+async def fetch_weather(params: dict):
+    """Fetch weather from the API (served from its shared cache on a hit)"""
+    async with httpx.AsyncClient() as client:
+        # Chat messages only show current conditions and daily summaries
+        response = await client.get(
+            f"{API_BASE_URL}/weather",
+            params={**params, "include": "current,daily"},
+            timeout=30.0
+        )
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code in (400, 404):
+            return None
+        raise Exception(f"Weather request failed: {response.status_code} {response.text}")
+
+async def fetch_suggestions(text: str, limit: int = 5) -> list:
+    """Known cities matching a partly typed name; empty when the API can't say"""
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{API_BASE_URL}/autocomplete", params={"q": text, "limit": limit}, timeout=5.0)
+        if response.status_code == 200:
+            return response.json()["results"]
+    except httpx.RequestError as e:
+        logger.error(f"Autocomplete failed for '{text}': {str(e)}")
+    return []
+
+def format_weather_message(weather: dict) -> str:
+    """Render an API weather payload as a chat message"""
+    current = weather["current"]
+    lines = [
+        f"🌤️ Weather in {current['city']}, {current.get('country', '')}".rstrip(", "),
+        f"{current['description'].capitalize()}",
+        "",
+        f"🌡️ {round(current['temperature'])}°C (feels like {round(current['feels_like'])}°C)",
+        f"💧 Humidity: {current['humidity']}%",
+        f"💨 Wind: {current['wind_speed']} m/s"
+    ]
+
+    if weather.get("forecast"):
+        lines.append("")
+        lines.append("📅 Next days:")
+        for day in weather["forecast"][:3]:
+            lines.append(f"{day['date']}: {round(day['temp_min'])}° / {round(day['temp_max'])}°, {day['description']}")
+
+    if weather.get("stale"):
+        lines.append("")
+        lines.append(f"⚠️ Weather service unavailable, showing data from {max(1, (weather.get('age_seconds') or 0) // 60)} min ago")
+
+    return "\n".join(lines)
+
+async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /weather command"""
+    chat_id = update.effective_chat.id
+
+    # "/weather Paris" looks up a city, plain "/weather" uses the registered location
+    if context.args:
+        params = {"city": " ".join(context.args)}
+    else:
+        params = {"chat_id": chat_id}
+
+    try:
+        weather = await fetch_weather(params)
+    except Exception as e:
+        logger.error(f"Error fetching weather for chat_id {chat_id}: {str(e)}")
+        await update.message.reply_text("❌ Sorry, I couldn't get the weather right now. Please try again later.")
+        return
+
+    if weather:
+        await update.message.reply_text(format_weather_message(weather))
+    elif context.args:
+        await update.message.reply_text(f"❌ I couldn't find weather for '{params['city']}'.")
+    else:
+        await update.message.reply_text("You haven't registered a location yet. Use /start to set one up!")
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle inline queries (@bot <city>)"""
+    query = update.inline_query
+    text = query.query.strip()
+
+    # Empty query falls back to the user's registered location (chat_id == user id in private chats).
+    # Inline text arrives keystroke by keystroke, so look up the best known city for the partial name.
+    if text:
+        suggestions = await fetch_suggestions(text, limit=1)
+        params = {"city": suggestions[0]["label"] if suggestions else text}
+    else:
+        params = {"chat_id": query.from_user.id}
+
+    try:
+        weather = await fetch_weather(params)
+    except Exception as e:
+        logger.error(f"Error answering inline query '{text}': {str(e)}")
+        weather = None
+
+    results = []
+    if weather:
+        current = weather["current"]
+        results.append(
+            InlineQueryResultArticle(
+                id=f"{current['city']}-{current['timestamp']}",
+                title=f"{current['city']}: {round(current['temperature'])}°C, {current['description']}",
+                description=f"Humidity {current['humidity']}% · Wind {current['wind_speed']} m/s",
+                input_message_content=InputTextMessageContent(format_weather_message(weather))
+            )
+        )
+
+    await query.answer(results, cache_time=300, is_personal=not text)
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
     help_text = """
@@ -238,6 +396,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 /start - Begin registration for weather alerts
 /changelocation - Update your location for weather alerts
+/weather - Current weather for your location (or /weather <city>)
 /help - Show this help message
 
 **Features:**
@@ -255,26 +414,40 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors in the telegram bot"""
     logger.error(f"Update {update} caused error {context.error}")
 
-def main():
-    """Start the bot"""
-    if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == "your_telegram_bot_token_here":
-        logger.error("Please set TELEGRAM_BOT_TOKEN in your .env file")
-        return
+def build_application(token: str = None, base_url: str = None) -> Application:
+    """Create the bot Application with all handlers registered"""
+    builder = Application.builder().token(token or TELEGRAM_BOT_TOKEN)
+    if base_url or TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(base_url or TELEGRAM_API_BASE_URL)
+    application = builder.build()
 
-    # Create the Application
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # Flood protection runs first and stops the update from reaching the handlers below
+    application.add_handler(TypeHandler(Update, flood_guard), group=-1)
 
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("changelocation", changelocation_command))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("weather", weather_command))
     application.add_handler(CallbackQueryHandler(button_callback))
+    application.add_handler(InlineQueryHandler(inline_query))
     application.add_handler(MessageHandler(filters.LOCATION, handle_location))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 
     # Add error handler
     application.add_error_handler(error_handler)
 
+    return application
+
+def main():
+    """Start the bot"""
+    if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == "your_telegram_bot_token_here":
+        logger.error("Please set TELEGRAM_BOT_TOKEN in your .env file")
+        return
+
+    # Create the Application
+    application = build_application()
+
     # Start the Bot
     logger.info("Starting WeatherSphere Telegram Bot...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,184 @@
+import asyncio
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+from sqlite_db import connect_sqlite
+
+# Budget for the OpenWeather API key, shared by every upstream call.
+# Calls are counted in fixed windows, per clock minute and per UTC day, the way the
+# provider counts them. With a path the counters live in a SQLite file, so every worker
+# on the host draws from one budget and a restart doesn't start with a fresh day;
+# without one they are kept per process.
+# Interactive lookups may use the whole budget; background work (alert sweeps,
+# geocoding for the spatial index) must leave a reserve and is deferred or
+# dropped when the budget runs low.
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+# (period, window length in seconds)
+QUOTA_PERIODS = (("minute", 60), ("day", 86400))
+
+UPSTREAM_QUOTA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upstream_usage (
+    period TEXT NOT NULL,
+    window_start INTEGER NOT NULL,
+    calls REAL NOT NULL,
+    PRIMARY KEY (period, window_start)
+);
+"""
+
+class QuotaExceeded(Exception):
+    pass
+
+class UpstreamQuota:
+    def __init__(
+        self,
+        per_minute: float = 60,
+        per_day: float = 30000,
+        background_reserve: float = 0.25,
+        interactive_max_wait: float = 2.0,
+        background_max_wait: float = 0.0,
+        path: Optional[str] = None
+    ):
+        self.limits = {"minute": per_minute, "day": per_day}
+        self.background_reserve = background_reserve
+        self.max_wait = {
+            PRIORITY_INTERACTIVE: interactive_max_wait,
+            PRIORITY_BACKGROUND: background_max_wait
+        }
+        self.granted = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self.deferred = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self.dropped = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        # Calls per (period, window_start) when there is no shared file
+        self.counts: Dict[tuple, float] = {}
+        self.current_windows: Dict[str, int] = {}
+        self.conn = connect_sqlite(path, UPSTREAM_QUOTA_SCHEMA) if path else None
+
+    def _windows(self, now: float) -> Dict[str, int]:
+        return {period: int(now // length) * length for period, length in QUOTA_PERIODS}
+
+    def _limit(self, period: str, priority: str) -> float:
+        # Background work may not dip into the reserve kept for interactive traffic
+        limit = self.limits[period]
+        return limit * (1 - self.background_reserve) if priority == PRIORITY_BACKGROUND else limit
+
+    def _used(self, windows: Dict[str, int]) -> Dict[str, float]:
+        if self.conn is None:
+            return {period: self.counts.get((period, start), 0.0) for period, start in windows.items()}
+        used = {period: 0.0 for period in windows}
+        for period, start in windows.items():
+            row = self.conn.execute(
+                "SELECT calls FROM upstream_usage WHERE period = ? AND window_start = ?",
+                (period, start)
+            ).fetchone()
+            if row:
+                used[period] = row[0]
+        return used
+
+    def _add(self, windows: Dict[str, int], cost: float, periods: tuple = ("minute", "day"), at_least: bool = False):
+        # at_least: raise the count in those periods to cost rather than adding to it
+        if windows != self.current_windows:
+            # A new window started: forget the finished ones
+            self.current_windows = windows
+            if self.conn is None:
+                self.counts = {key: calls for key, calls in self.counts.items() if key[1] >= windows[key[0]]}
+            else:
+                for period, start in windows.items():
+                    self.conn.execute("DELETE FROM upstream_usage WHERE period = ? AND window_start < ?", (period, start))
+        for period in periods:
+            start = windows[period]
+            if self.conn is None:
+                used = self.counts.get((period, start), 0.0)
+                self.counts[(period, start)] = max(used, cost) if at_least else used + cost
+            else:
+                update = "MAX(calls, excluded.calls)" if at_least else "calls + excluded.calls"
+                self.conn.execute(
+                    "INSERT INTO upstream_usage (period, window_start, calls) VALUES (?, ?, ?) "
+                    f"ON CONFLICT(period, window_start) DO UPDATE SET calls = {update}",
+                    (period, start, cost)
+                )
+
+    def _take(self, priority: str, cost: float) -> float:
+        """Count cost against every window if it fits, returning 0; otherwise seconds until it might"""
+        now = time.time()
+        windows = self._windows(now)
+
+        def take() -> float:
+            used = self._used(windows)
+            wait = max(
+                (windows[period] + length - now for period, length in QUOTA_PERIODS
+                 if used[period] + cost > self._limit(period, priority)),
+                default=0.0
+            )
+            if not wait:
+                self._add(windows, cost)
+            return wait
+
+        if self.conn is None:
+            return take()
+        # Read and update in one write transaction, so workers can't both take the last call
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                wait = take()
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return wait
+        except sqlite3.Error as e:
+            # A busy or broken file shouldn't stop every lookup; the provider still enforces the limit
+            print(f"Warning: could not check the shared upstream budget: {e}")
+            return 0.0
+
+    def try_acquire(self, priority: str = PRIORITY_INTERACTIVE, cost: float = 1.0) -> bool:
+        if self._take(priority, cost):
+            return False
+        self.granted[priority] += 1
+        return True
+
+    async def acquire(self, priority: str = PRIORITY_INTERACTIVE, cost: float = 1.0):
+        """Take budget for one upstream call, waiting up to the priority's limit"""
+        if self.try_acquire(priority, cost):
+            return
+        self.deferred[priority] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait[priority]
+        while True:
+            wait = self._take(priority, cost)
+            if not wait:
+                self.granted[priority] += 1
+                return
+            if loop.time() + wait > deadline:
+                self.dropped[priority] += 1
+                raise QuotaExceeded(f"OpenWeather budget exhausted for {priority} requests")
+            await asyncio.sleep(wait)
+
+    def exhausted(self):
+        """Upstream answered 429: stop spending until the current minute is over"""
+        windows = self._windows(time.time())
+        try:
+            self._add(windows, self.limits["minute"], periods=("minute",), at_least=True)
+        except sqlite3.Error as e:
+            print(f"Warning: could not record the upstream rate limit: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        windows = self._windows(time.time())
+        try:
+            used = self._used(windows)
+        except sqlite3.Error as e:
+            print(f"Warning: could not read the shared upstream budget: {e}")
+            used = {period: None for period in windows}
+        return {
+            "shared": self.conn is not None,
+            "minute_remaining": round(self.limits["minute"] - used["minute"], 2) if used["minute"] is not None else None,
+            "minute_limit": self.limits["minute"],
+            "day_remaining": round(self.limits["day"] - used["day"], 2) if used["day"] is not None else None,
+            "day_limit": self.limits["day"],
+            "background_reserve": self.background_reserve,
+            "granted": dict(self.granted),
+            "deferred": dict(self.deferred),
+            "dropped": dict(self.dropped)
+        }
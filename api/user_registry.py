@@ -0,0 +1,119 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from storage import StorageBackend
+
+# In-process registry of users keyed by chat_id.
+# Reads are served from memory; register/delete write through to storage and
+# update the registry, and TTLs bound staleness when other workers write.
+
+class UserRecord:
+    __slots__ = ("id", "chat_id", "city", "latitude", "longitude", "loaded_at")
+
+    def __init__(self, id: int, chat_id: int, city: Optional[str], latitude: Optional[float], longitude: Optional[float], loaded_at: float):
+        self.id = id
+        self.chat_id = chat_id
+        self.city = city
+        self.latitude = latitude
+        self.longitude = longitude
+        self.loaded_at = loaded_at
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any], loaded_at: float) -> "UserRecord":
+        return cls(row["id"], row["chat_id"], row.get("city"), row.get("latitude"), row.get("longitude"), loaded_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "chat_id": self.chat_id,
+            "city": self.city,
+            "latitude": self.latitude,
+            "longitude": self.longitude
+        }
+
+class UserRegistry:
+    def __init__(self, storage: StorageBackend, ttl: float = 300, missing_ttl: float = 30, max_missing: int = 10000):
+        self.storage = storage
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.max_missing = max_missing
+        self.records: Dict[int, UserRecord] = {}
+        # chat_ids known not to be registered, so repeated dashboard probes don't hit storage
+        self.missing: Dict[int, float] = {}
+        # Called with the chat_id (or None for "everything") whenever this worker changes a user,
+        # so a multi-worker deployment can tell its peers to invalidate
+        self.listeners: List[Callable[[Optional[int]], Any]] = []
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, chat_id: int) -> Optional[UserRecord]:
+        now = time.time()
+        record = self.records.get(chat_id)
+        if record is not None and now - record.loaded_at < self.ttl:
+            self.hits += 1
+            return record
+        missing_at = self.missing.get(chat_id)
+        if missing_at is not None and now - missing_at < self.missing_ttl:
+            self.hits += 1
+            return None
+
+        self.misses += 1
+        rows = await self.storage.select("users", {"chat_id": chat_id}, limit=1)
+        if rows:
+            return self.put(rows[0])
+        self._mark_missing(chat_id, now)
+        return None
+
+    def put(self, row: Dict[str, Any]) -> UserRecord:
+        """Write-through after a successful insert/update"""
+        record = UserRecord.from_row(row, time.time())
+        self.records[record.chat_id] = record
+        self.missing.pop(record.chat_id, None)
+        return record
+
+    def remove(self, chat_id: int):
+        """Write-through after a successful delete"""
+        self.records.pop(chat_id, None)
+        self._mark_missing(chat_id, time.time())
+
+    def _mark_missing(self, chat_id: int, now: float):
+        if len(self.missing) >= self.max_missing:
+            self.missing = {c: t for c, t in self.missing.items() if now - t < self.missing_ttl}
+            if len(self.missing) >= self.max_missing:
+                self.missing.clear()
+        self.missing[chat_id] = now
+
+    def invalidate(self, chat_id: Optional[int] = None):
+        """Drop one chat_id (or everything) so the next read goes back to storage"""
+        if chat_id is None:
+            self.records.clear()
+            self.missing.clear()
+        else:
+            self.records.pop(chat_id, None)
+            self.missing.pop(chat_id, None)
+
+    def notify(self, chat_id: Optional[int] = None):
+        for listener in self.listeners:
+            try:
+                listener(chat_id)
+            except Exception as e:
+                print(f"Warning: user registry listener failed: {e}")
+
+    async def load_all(self, page_size: int = 1000) -> int:
+        """Bulk-load every user, e.g. at startup"""
+        loaded = 0
+        now = time.time()
+        async for rows in self.storage.paginate("users", "id,chat_id,city,latitude,longitude", page_size):
+            for row in rows:
+                self.records[row["chat_id"]] = UserRecord.from_row(row, now)
+            loaded += len(rows)
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.records),
+            "missing_entries": len(self.missing),
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl": self.ttl
+        }
@@ -0,0 +1,96 @@
+import sys
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from storage import StorageBackend
+from weather_cache import location_key
+
+# Compact columnar snapshot of the users table for alert sweeps.
+# One row per user across parallel arrays; each distinct location is stored
+# once and referenced by index, so a million users cost tens of megabytes
+# instead of a million JSON-decoded dicts.
+
+DEFAULT_RULE = 0
+
+class UserSnapshot:
+    def __init__(self):
+        self.chat_ids = array("q")
+        self.location_ids = array("I")
+        self.latitudes = array("f")
+        self.longitudes = array("f")
+        self.rule_ids = array("B")
+        # Interned location keys; city locations keep their name, coordinate
+        # locations are queried with the coordinates of their first user
+        self.location_keys: List[str] = []
+        self.location_cities: List[Optional[str]] = []
+        self.location_first_row = array("I")
+        self.location_index: Dict[str, int] = {}
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self.chat_ids)
+
+    def add(self, chat_id: int, city: Optional[str], latitude: Optional[float], longitude: Optional[float], rule_id: int = DEFAULT_RULE):
+        try:
+            key = location_key(city, latitude, longitude)
+        except ValueError:
+            # Users without any usable location can't be alerted
+            self.skipped += 1
+            return
+
+        location_id = self.location_index.get(key)
+        if location_id is None:
+            location_id = len(self.location_keys)
+            self.location_index[key] = location_id
+            self.location_keys.append(sys.intern(key))
+            self.location_cities.append(sys.intern(city.strip()) if key.startswith("q:") else None)
+            self.location_first_row.append(len(self.chat_ids))
+
+        self.chat_ids.append(chat_id)
+        self.location_ids.append(location_id)
+        self.latitudes.append(float(latitude) if latitude is not None else float("nan"))
+        self.longitudes.append(float(longitude) if longitude is not None else float("nan"))
+        self.rule_ids.append(rule_id)
+
+    @classmethod
+    async def from_storage(cls, storage: StorageBackend, page_size: int = 1000) -> "UserSnapshot":
+        snapshot = cls()
+        # Only one page of dicts is alive at a time
+        async for rows in storage.paginate("users", "id,chat_id,city,latitude,longitude", page_size):
+            for row in rows:
+                snapshot.add(row["chat_id"], row.get("city"), row.get("latitude"), row.get("longitude"))
+        return snapshot
+
+    def users_by_location(self) -> List[array]:
+        """Row indices grouped by location id"""
+        groups = [array("I") for _ in self.location_keys]
+        for row, location_id in enumerate(self.location_ids):
+            groups[location_id].append(row)
+        return groups
+
+    def iter_locations(self) -> Iterator[Tuple[int, str, Tuple[Optional[str], Optional[float], Optional[float]]]]:
+        """(location_id, key, (city, latitude, longitude)) for every distinct location"""
+        for location_id, key in enumerate(self.location_keys):
+            city = self.location_cities[location_id]
+            if city is not None:
+                yield location_id, key, (city, None, None)
+            else:
+                row = self.location_first_row[location_id]
+                yield location_id, key, (None, self.latitudes[row], self.longitudes[row])
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the snapshot"""
+        columns = (self.chat_ids, self.location_ids, self.latitudes, self.longitudes, self.rule_ids, self.location_first_row)
+        total = sum(sys.getsizeof(column) for column in columns)
+        total += sys.getsizeof(self.location_keys) + sys.getsizeof(self.location_index) + sys.getsizeof(self.location_cities)
+        total += sum(sys.getsizeof(key) for key in self.location_keys)
+        total += sum(sys.getsizeof(city) for city in set(self.location_cities) if city is not None)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self),
+            "locations": len(self.location_keys),
+            "skipped": self.skipped,
+            "bytes": self.nbytes()
+        }
@@ -0,0 +1,278 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# In-process TTL cache for processed weather payloads, shared by the
+# /weather endpoint, the bot-facing lookups and the alert sweep.
+
+def location_key(city: Optional[str] = None, latitude: Optional[float] = None, longitude: Optional[float] = None) -> str:
+    """Build the cache key for a location. Coordinates are rounded to ~1 km."""
+    if city and city.strip():
+        return "q:" + " ".join(city.strip().lower().split())
+    if latitude is not None and longitude is not None:
+        return f"ll:{latitude:.2f},{longitude:.2f}"
+    raise ValueError("Either city name or coordinates are required")
+
+class WeatherCache:
+    def __init__(
+        self,
+        ttl: float = 600,
+        store: Optional[Any] = None,
+        lease_seconds: float = 15,
+        lease_poll: float = 0.05,
+        missing_ttl: float = 300,
+        max_missing: int = 10000,
+        max_entries: int = 5000,
+        stale_ttl: float = 3600,
+        failure_ttl: float = 10,
+        shared_failure: Optional[Callable[[Exception], Optional[Tuple[int, str]]]] = None,
+        failure_error: Optional[Callable[[int, str], Exception]] = None
+    ):
+        self.ttl = ttl
+        # Entries are kept in fetch order: at most max_entries, and none older than ttl + stale_ttl
+        # (expired ones linger that long only as degraded-mode fallbacks)
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        # Optional WeatherStore; fresh payloads are written through so a restart can warm up from disk.
+        # Workers sharing the store read each other's entries on a local miss.
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.lease_poll = lease_poll
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.shared_hits = 0
+        self.lease_waits = 0
+        # Failed refreshes are shared through the store too, so workers polling the lease stop
+        # instead of retrying upstream one after another: shared_failure picks which exceptions
+        # to share as (status, detail), kept missing_ttl for a 404 and failure_ttl otherwise,
+        # and failure_error rebuilds the exception in the other workers
+        self.failure_ttl = failure_ttl
+        self.shared_failure = shared_failure
+        self.failure_error = failure_error
+        self.shared_failures = 0
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        # Callers still awaiting each in-flight load
+        self.waiters: Dict[asyncio.Future, int] = {}
+        self.hits = 0
+        self.misses = 0
+        # Negative entries: locations upstream doesn't know, remembered briefly (oldest first)
+        self.missing_ttl = missing_ttl
+        self.max_missing = max_missing
+        self.missing: "OrderedDict[str, float]" = OrderedDict()
+        self.missing_hits = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value if it is still fresh"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > self.ttl:
+            return None
+        return value
+
+    def stored_at(self, key: str) -> Optional[float]:
+        """When the cached entry for key was fetched, identifying the snapshot"""
+        entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def get_stale(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Last known (stored_at, value) regardless of age, for degraded mode"""
+        entry = self.entries.get(key)
+        if entry is None and self.store is not None:
+            try:
+                entry = self.store.get(key)
+            except Exception as e:
+                print(f"Warning: could not read last known weather for {key}: {e}")
+        return entry
+
+    def is_missing(self, key: str) -> bool:
+        """True while key is remembered as unknown upstream"""
+        expires_at = self.missing.get(key)
+        if expires_at is None:
+            return False
+        if time.time() >= expires_at:
+            del self.missing[key]
+            return False
+        self.missing_hits += 1
+        return True
+
+    def mark_missing(self, key: str):
+        self.missing.pop(key, None)
+        while len(self.missing) >= self.max_missing:
+            self.missing.popitem(last=False)
+        self.missing[key] = time.time() + self.missing_ttl
+
+    def _put(self, key: str, entry: Tuple[float, Any]):
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        cutoff = time.time() - self.ttl - self.stale_ttl
+        while self.entries:
+            oldest = next(iter(self.entries))
+            if len(self.entries) <= self.max_entries and self.entries[oldest][0] >= cutoff:
+                break
+            del self.entries[oldest]
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None):
+        stored_at = stored_at or time.time()
+        self._put(key, (stored_at, value))
+        if self.store is not None:
+            try:
+                self.store.save(key, stored_at, value)
+            except Exception as e:
+                print(f"Warning: could not persist weather cache entry {key}: {e}")
+
+    def load_from_store(self) -> int:
+        """Reload still-fresh entries from the store, e.g. at startup"""
+        if self.store is None:
+            return 0
+        self.store.compact()
+        loaded = 0
+        for key, stored_at, value in self.store.load(self.ttl):
+            self._put(key, (stored_at, value))
+            loaded += 1
+        return loaded
+
+    def invalidate(self, key: str):
+        self.entries.pop(key, None)
+        if self.store is not None:
+            try:
+                self.store.delete(key)
+            except Exception as e:
+                print(f"Warning: could not remove weather cache entry {key}: {e}")
+
+    # Helper function to read a fresh entry another worker put in the shared store
+    def _shared_get(self, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            entry = self.store.get(key)
+        except Exception as e:
+            print(f"Warning: shared weather cache read failed for {key}: {e}")
+            return None
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry
+
+    # Helper function to take the refresh lease; store errors mean "refresh it ourselves"
+    def _acquire_lease(self, key: str) -> bool:
+        try:
+            return self.store.acquire_lease(key, self.owner, self.lease_seconds)
+        except Exception as e:
+            print(f"Warning: could not take refresh lease for {key}: {e}")
+            return True
+
+    def _release_lease(self, key: str):
+        try:
+            self.store.release_lease(key, self.owner)
+        except Exception as e:
+            print(f"Warning: could not release refresh lease for {key}: {e}")
+
+    # Helper function to record a failed refresh in the shared store for the other workers
+    def _share_failure(self, key: str, error: Exception):
+        if self.shared_failure is None or self.failure_error is None:
+            return
+        shared = self.shared_failure(error)
+        if shared is None:
+            return
+        status, detail = shared
+        ttl = self.missing_ttl if status == 404 else self.failure_ttl
+        try:
+            self.store.save_failure(key, status, detail, time.time() + ttl)
+        except Exception as e:
+            print(f"Warning: could not share failed refresh for {key}: {e}")
+
+    # Helper function to raise a failure another worker recorded for key, if one is still current
+    def _raise_shared_failure(self, key: str):
+        if self.failure_error is None:
+            return
+        try:
+            failure = self.store.get_failure(key)
+        except Exception as e:
+            print(f"Warning: shared weather failure read failed for {key}: {e}")
+            return
+        if failure is not None:
+            self.shared_failures += 1
+            raise self.failure_error(*failure)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if self.store is None:
+            value = await loader()
+            self.set(key, value)
+            return value
+
+        # Across workers: reuse a fresh shared entry, otherwise only the lease holder refreshes
+        # while the others poll the store until the new entry lands or the lease expires
+        while True:
+            entry = self._shared_get(key)
+            if entry is not None:
+                self.shared_hits += 1
+                self._put(key, entry)
+                return entry[1]
+            self._raise_shared_failure(key)
+            if self._acquire_lease(key):
+                try:
+                    value = await loader()
+                    self.set(key, value)
+                    return value
+                except Exception as e:
+                    self._share_failure(key, e)
+                    raise
+                finally:
+                    self._release_lease(key)
+            self.lease_waits += 1
+            await asyncio.sleep(self.lease_poll)
+
+    async def get_or_fetch(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve from cache, otherwise run loader once even for concurrent callers"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        # Single-flight: concurrent callers share one load. It runs in its own task, so a
+        # cancelled caller (e.g. a disconnected client) doesn't fail the others waiting on it;
+        # the load itself is cancelled only once nobody is waiting for it any more
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            pending = asyncio.ensure_future(self._load(key, loader))
+            self.inflight[key] = pending
+            pending.add_done_callback(lambda task: self._load_done(key, task))
+        self.waiters[pending] = self.waiters.get(pending, 0) + 1
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            waiting = self.waiters.get(pending, 1) - 1
+            if waiting:
+                self.waiters[pending] = waiting
+            else:
+                self.waiters.pop(pending, None)
+                if not pending.done():
+                    pending.cancel()
+
+    def _load_done(self, key: str, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        self.waiters.pop(task, None)
+        # Mark the exception as retrieved when nobody was left waiting
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl": self.ttl,
+            "persisted_entries": self.store.count() if self.store is not None else None,
+            "shared_hits": self.shared_hits,
+            "lease_waits": self.lease_waits,
+            "shared_failures": self.shared_failures,
+            "missing_entries": len(self.missing),
+            "missing_hits": self.missing_hits
+        }
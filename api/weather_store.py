@@ -0,0 +1,113 @@
+import json
+import time
+from typing import Any, List, Optional, Tuple
+
+from sqlite_db import connect_sqlite
+
+# On-disk copy of the weather cache so a restarted process can serve
+# still-fresh snapshots immediately instead of refetching everything.
+# Every worker on the host opens the same file, which makes it the shared
+# cache tier; refresh leases ensure only one worker refetches an expired key.
+
+WEATHER_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_snapshots (
+    key TEXT PRIMARY KEY,
+    stored_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_weather_snapshots_stored_at ON weather_snapshots(stored_at);
+CREATE TABLE IF NOT EXISTS weather_leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS weather_failures (
+    key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    detail TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+class WeatherStore:
+    def __init__(self, path: str, max_entries: int = 5000, retention: float = 86400, compact_every: int = 200):
+        self.path = path
+        self.max_entries = max_entries
+        self.retention = retention
+        self.compact_every = compact_every
+        self.writes_since_compact = 0
+        # A busy file fails fast: callers run on the event loop and fall back to fetching directly
+        self.conn = connect_sqlite(path, WEATHER_STORE_SCHEMA)
+
+    def save(self, key: str, stored_at: float, value: Any):
+        # Atomic replace: readers see either the old snapshot or the new one
+        self.conn.execute(
+            "INSERT OR REPLACE INTO weather_snapshots (key, stored_at, payload) VALUES (?, ?, ?)",
+            (key, stored_at, json.dumps(value, separators=(",", ":")))
+        )
+        self.writes_since_compact += 1
+        if self.writes_since_compact >= self.compact_every:
+            self.compact()
+
+    def load(self, max_age: float) -> List[Tuple[str, float, Any]]:
+        """Snapshots stored within the last max_age seconds, oldest first"""
+        rows = self.conn.execute(
+            "SELECT key, stored_at, payload FROM weather_snapshots WHERE stored_at > ? ORDER BY stored_at",
+            (time.time() - max_age,)
+        ).fetchall()
+        return [(key, stored_at, json.loads(payload)) for key, stored_at, payload in rows]
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        row = self.conn.execute(
+            "SELECT stored_at, payload FROM weather_snapshots WHERE key = ?",
+            (key,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def delete(self, key: str):
+        self.conn.execute("DELETE FROM weather_snapshots WHERE key = ?", (key,))
+
+    def acquire_lease(self, key: str, owner: str, duration: float) -> bool:
+        """Take the refresh lease for key unless another owner holds an unexpired one"""
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO weather_leases (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE weather_leases.expires_at < ? OR weather_leases.owner = excluded.owner",
+            (key, owner, now + duration, now)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key: str, owner: str):
+        self.conn.execute("DELETE FROM weather_leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def save_failure(self, key: str, status: int, detail: str, expires_at: float):
+        """Remember a failed refresh so other workers don't repeat it until expires_at"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO weather_failures (key, status, detail, expires_at) VALUES (?, ?, ?, ?)",
+            (key, status, detail, expires_at)
+        )
+
+    def get_failure(self, key: str) -> Optional[Tuple[int, str]]:
+        row = self.conn.execute(
+            "SELECT status, detail FROM weather_failures WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def compact(self):
+        """Drop snapshots past retention, then the oldest beyond max_entries"""
+        self.writes_since_compact = 0
+        self.conn.execute("DELETE FROM weather_snapshots WHERE stored_at < ?", (time.time() - self.retention,))
+        self.conn.execute(
+            "DELETE FROM weather_snapshots WHERE key IN ("
+            "SELECT key FROM weather_snapshots ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self.conn.execute("DELETE FROM weather_leases WHERE expires_at < ?", (time.time(),))
+        self.conn.execute("DELETE FROM weather_failures WHERE expires_at < ?", (time.time(),))
+        # Fold the WAL back into the main file so it doesn't grow without bound
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM weather_snapshots").fetchone()[0]
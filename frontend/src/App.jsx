@@ -1,57 +1,69 @@
 import { useState, useEffect } from "react";
 import "./App.css";
 
+const API_BASE_URL = import.meta.env.VITE_API_URL || "https://nasa-hack-88nz.onrender.com";
+
 function App() {
   const [city, setCity] = useState("");
   const [weather, setWeather] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
   const [autoFilled, setAutoFilled] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
 
-  // Fetch user location by chat_id
-  const fetchUserLocation = async (chatId) => {
-    try {
-      // Using CORS proxy for now
-      const response = await fetch(
-        `https://corsproxy.io/?https://nasa-hack-88nz.onrender.com/get_location/${chatId}`
-      );
-
-      if (response.ok) {
-        const data = await response.json();
-        if (data.has_location && data.city) {
-          setCity(data.city);
-          setAutoFilled(true);
-          // Auto-fetch weather for the user's location
-          await fetchWeatherForCity(data.city);
+  // Suggest known cities while typing; answered by the API's offline gazetteer
+  useEffect(() => {
+    const query = city.trim();
+    if (autoFilled || query.length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(
+          `${API_BASE_URL}/autocomplete?q=${encodeURIComponent(query)}&limit=8`,
+          { signal: controller.signal }
+        );
+        if (response.ok) {
+          const data = await response.json();
+          setSuggestions(data.results);
+        }
+      } catch (err) {
+        if (err.name !== "AbortError") {
+          setSuggestions([]);
         }
       }
-    } catch (err) {
-      console.error("Failed to fetch user location:", err);
-    }
-  };
-
-  // Fetch weather for a specific city
-  const fetchWeatherForCity = async (cityName) => {
-    if (!cityName.trim()) return;
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [city, autoFilled]);
 
+  // Fetch the user's location and its weather in one request
+  const fetchDashboard = async (chatId) => {
     setLoading(true);
     setError("");
     setWeather(null);
 
     try {
-      const response = await fetch(
-        `https://corsproxy.io/?https://nasa-hack-88nz.onrender.com/weather?city=${encodeURIComponent(cityName.trim())}`
-      );
+      const response = await fetch(`${API_BASE_URL}/dashboard/${encodeURIComponent(chatId)}`);
 
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(errorData.detail || "Failed to fetch weather data");
+      if (response.ok) {
+        const data = await response.json();
+        if (data.location.city) {
+          setCity(data.location.city);
+          setAutoFilled(true);
+        }
+        if (data.weather) {
+          setWeather(data.weather);
+        } else if (data.weather_error) {
+          setError(data.weather_error);
+        }
       }
-
-      const data = await response.json();
-      setWeather(data);
     } catch (err) {
-      setError(err.message || "An error occurred while fetching weather data");
+      console.error("Failed to fetch dashboard:", err);
     } finally {
       setLoading(false);
     }
@@ -63,7 +75,7 @@ function App() {
     const chatId = urlParams.get('chat_id');
 
     if (chatId) {
-      fetchUserLocation(chatId);
+      fetchDashboard(chatId);
     }
   }, []);
 
@@ -78,17 +90,10 @@ function App() {
     setWeather(null);
 
     try {
-      // Temporary CORS proxy solution - change back to direct URL once Render deploys properly
+      // Set VITE_API_URL=http://localhost:8000 to use a local API
       const response = await fetch(
-        `https://corsproxy.io/?https://nasa-hack-88nz.onrender.com/weather?city=${encodeURIComponent(city.trim())}`
+        `${API_BASE_URL}/weather?city=${encodeURIComponent(city.trim())}`
       );
-      // Original URL (uncomment once Render deployment with CORS fixes is complete):
-      // const response = await fetch(
-      //   `https://nasa-hack-88nz.onrender.com/weather?city=${encodeURIComponent(city.trim())}`
-      // );
-      // const response = await fetch(
-      //   `http://localhost:8000/weather?city=${encodeURIComponent(city.trim())}`
-      // );
 
       if (!response.ok) {
         const errorData = await response.json();
@@ -139,6 +144,7 @@ function App() {
             <div className="flex gap-2">
               <input
                 type="text"
+                list="city-suggestions"
                 value={city}
                 onChange={(e) => {
                   setCity(e.target.value);
@@ -149,6 +155,11 @@ function App() {
                   autoFilled ? "border-green-300 bg-green-50" : "border-gray-300"
                 }`}
               />
+              <datalist id="city-suggestions">
+                {suggestions.map((suggestion) => (
+                  <option key={suggestion.id} value={suggestion.label} />
+                ))}
+              </datalist>
               <button
                 type="submit"
                 disabled={loading}